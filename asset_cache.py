@@ -0,0 +1,61 @@
+'''Per-process cache of the asset table.
+
+Every entry point needs asset rows by symbol: execution sizes orders from min_lot_size and
+min_notional, the monthly stages key their results on asset ids, data_fetch rewrites the rows
+from exchangeInfo. The whole table is a few hundred rows, so it is read in one query and kept in
+memory for ttl_seconds. Inside the Functions worker the cache stays warm between timer
+invocations; data_fetch refreshes it after its upsert so execution never sizes from stale filters.
+'''
+from collections import namedtuple
+from decimal import Decimal
+import logging
+import threading
+import time
+from sqlalchemy import text
+
+DEFAULT_TTL_SECONDS = 15 * 60
+
+# min_lot_size / min_notional as Decimal (NUMERIC columns), None when the asset has no filter yet
+AssetInfo = namedtuple('AssetInfo', ['id', 'symbol', 'min_lot_size', 'min_notional', 'trading'])
+
+assets_query = text('SELECT id, symbol, min_lot_size, min_notional, trading FROM asset')
+
+def _decimal(value):
+    return None if value is None else Decimal(str(value))
+
+class AssetCache:
+    def __init__(self, rows, loaded_at: float):
+        self.loaded_at = loaded_at
+        self.assets = {symbol: AssetInfo(int(asset_id), symbol, _decimal(min_lot_size), _decimal(min_notional), trading) for asset_id, symbol, min_lot_size, min_notional, trading in rows}
+
+    def __getitem__(self, symbol) -> AssetInfo:
+        return self.assets[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self.assets
+
+    def __len__(self):
+        return len(self.assets)
+
+    def ids(self) -> dict:
+        # symbol -> asset id
+        return {symbol: info.id for symbol, info in self.assets.items()}
+
+    def age(self) -> float:
+        return time.time() - self.loaded_at
+
+# One cache per database, shared by every invocation in the process
+_caches = {}
+_lock = threading.Lock()
+
+def load_asset_cache(engine, ttl_seconds: int = DEFAULT_TTL_SECONDS, refresh: bool = False) -> AssetCache:
+    key = engine.url.render_as_string(hide_password=True)
+    with _lock:
+        cache = _caches.get(key)
+        if cache is not None and not refresh and cache.age() < ttl_seconds:
+            return cache
+        with engine.connect() as connection:
+            rows = connection.execute(assets_query).fetchall()
+        cache = _caches[key] = AssetCache(rows, time.time())
+    logging.info(f'Asset cache loaded | {len(cache)} assets')
+    return cache
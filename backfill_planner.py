@@ -0,0 +1,82 @@
+from datetime import timedelta
+from sqlalchemy import text
+import logging
+from watermarks import covers_window
+
+# Binance returns at most 1000 klines per continuousKlines request
+PAGE_SIZE = 1000
+
+INTERVAL_DELTAS = {
+    '1d': timedelta(days=1),
+}
+
+# Every expected bar in the window for the requested symbols, anti-joined against asset_price.
+# Consecutive missing bars are collapsed into (gap_start, gap_end) ranges with the gaps-and-islands trick.
+missing_ranges_query = text('''
+    WITH expected AS (
+        SELECT a.id AS asset_id, a.symbol, s.open_time
+        FROM asset AS a
+        CROSS JOIN generate_series(CAST(:window_start AS TIMESTAMPTZ), CAST(:window_end AS TIMESTAMPTZ), CAST(:step AS INTERVAL)) AS s(open_time)
+        WHERE a.symbol = ANY(:symbols)
+    ),
+    missing AS (
+        SELECT e.asset_id, e.symbol, e.open_time,
+            e.open_time - ROW_NUMBER() OVER (PARTITION BY e.asset_id ORDER BY e.open_time) * CAST(:step AS INTERVAL) AS island
+        FROM expected AS e
+        WHERE NOT EXISTS (
+            SELECT 1 FROM asset_price AS ap
+            WHERE ap.asset_id = e.asset_id AND ap.open_time = e.open_time
+        )
+    )
+    SELECT asset_id, symbol, MIN(open_time) AS gap_start, MAX(open_time) AS gap_end, COUNT(*) AS bars
+    FROM missing
+    GROUP BY asset_id, symbol, island
+    ORDER BY symbol, gap_start;
+''')
+
+def find_missing_ranges(session, symbols: list, window_start, window_end, interval: str = '1d'):
+    # Returns [(asset_id, symbol, gap_start, gap_end, bars)] for every hole in the window in a single query
+    step = INTERVAL_DELTAS[interval]
+    result = session.execute(missing_ranges_query, {
+        'symbols': list(symbols),
+        'window_start': window_start,
+        'window_end': window_end,
+        'step': step,
+    })
+    return [tuple(row) for row in result]
+
+def paginate_range(gap_start, gap_end, interval: str = '1d', page_size: int = PAGE_SIZE):
+    # Split an inclusive range of bar open times into (startTime, endTime) millisecond pages of at most page_size bars
+    step = INTERVAL_DELTAS[interval]
+    pages = []
+    page_start = gap_start
+    while page_start <= gap_end:
+        page_end = min(page_start + step * (page_size - 1), gap_end)
+        start_ms = int(page_start.timestamp() * 1000)
+        end_ms = int((page_end + step).timestamp() * 1000) - 1
+        pages.append((start_ms, end_ms))
+        page_start = page_end + step
+    return pages
+
+def plan_backfill(session, symbols: list, window_start, window_end, interval: str = '1d', page_size: int = PAGE_SIZE, watermarks: dict = None):
+    # Fetch jobs (symbol, asset_id, startTime, endTime) covering exactly the missing bars.
+    # With watermarks, assets whose stored bars already span the window without holes skip the gap scan.
+    if watermarks is not None:
+        step = INTERVAL_DELTAS[interval]
+        scan_symbols = [symbol for symbol in symbols if symbol not in watermarks or not covers_window(watermarks[symbol], window_start, window_end, step)]
+        logging.info(f'Watermarks cover {len(symbols) - len(scan_symbols)} of {len(symbols)} symbols')
+        symbols = scan_symbols
+
+    if not symbols:
+        return []
+
+    gaps = find_missing_ranges(session, symbols, window_start, window_end, interval)
+    jobs = []
+    missing_bars = 0
+    for asset_id, symbol, gap_start, gap_end, bars in gaps:
+        missing_bars += bars
+        for start_ms, end_ms in paginate_range(gap_start, gap_end, interval, page_size):
+            jobs.append((symbol, asset_id, start_ms, end_ms))
+
+    logging.info(f'Backfill plan | {len(gaps)} gaps | {missing_bars} missing bars | {len(jobs)} requests')
+    return jobs
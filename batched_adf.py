@@ -0,0 +1,128 @@
+'''Batched augmented Dickey-Fuller test.
+
+Reproduces statsmodels.tsa.stattools.adfuller(x, regression, autolag='AIC') for many equal
+length series at once. The lag matrix is built once per batch at maxlag, and one QR of the
+design with the response appended gives the residual sum of squares of every nested lag order
+(the tail of the response column of R), so the AIC search costs a single factorisation. Each
+series is then refitted once with its chosen lag on the longest sample that lag allows, as
+adfuller does, and the t-statistic of the level term is mapped to MacKinnon p-values.
+
+With a constant the regressions are run on demeaned columns, which gives the same coefficients
+and residuals (Frisch-Waugh) with a far better conditioned design.
+'''
+import numpy as np
+from scipy.stats import norm
+from statsmodels.tsa.adfvalues import _tau_maxs, _tau_mins, _tau_stars, _tau_smallps, _tau_largeps
+from statsmodels.tsa.stattools import adfuller
+
+REGRESSIONS = ('c', 'n')
+
+def mackinnonp(stats, regression: str = 'c', N: int = 1) -> np.ndarray:
+    # Vectorised statsmodels.tsa.adfvalues.mackinnonp
+    stats = np.asarray(stats, dtype=np.float64)
+    small = np.polyval(np.asarray(_tau_smallps[regression][N - 1])[::-1], stats)
+    large = np.polyval(np.asarray(_tau_largeps[regression][N - 1])[::-1], stats)
+    with np.errstate(invalid='ignore'):
+        pvalues = norm.cdf(np.where(stats <= _tau_stars[regression][N - 1], small, large))
+    pvalues = np.where(stats > _tau_maxs[regression][N - 1], 1.0, pvalues)
+    pvalues = np.where(stats < _tau_mins[regression][N - 1], 0.0, pvalues)
+    return pvalues
+
+def default_maxlag(nobs: int, ntrend: int = 0) -> int:
+    # Schwert rule used by adfuller when maxlag is None
+    maxlag = int(np.ceil(12.0 * np.power(nobs / 100.0, 1 / 4.0)))
+    maxlag = min(nobs // 2 - ntrend - 1, maxlag)
+    if maxlag < 0:
+        raise ValueError('sample size is too short to use selected regression component')
+    return maxlag
+
+def adf_design(series: np.ndarray, lags: int):
+    # Stacked ADF regression for (P, T) series with no deterministic terms:
+    # columns [level_{t-1}, diff_{t-1}, ..., diff_{t-lags}], response diff_t
+    diff = np.diff(series, axis=1)
+    nobs = diff.shape[1] - lags
+    columns = [series[:, lags:lags + nobs]]
+    for k in range(1, lags + 1):
+        columns.append(diff[:, lags - k:lags - k + nobs])
+    return np.stack(columns, axis=2), diff[:, lags:]
+
+def _factorise(series: np.ndarray, lags: int, regression: str):
+    # R of the QR of [design | response] for every series, demeaned when there is a constant
+    design, response = adf_design(series, lags)
+    augmented = np.concatenate([design, response[..., None]], axis=2)
+    if regression == 'c':
+        augmented = augmented - augmented.mean(axis=1, keepdims=True)
+    return np.linalg.qr(augmented, mode='r'), response.shape[1]
+
+def adf_batch(series: np.ndarray, regression: str = 'c', maxlag: int = None, autolag: str = 'AIC'):
+    '''ADF (stats, pvalues, usedlags, nobs) for every row of a (P, T) float64 array.
+    Matches adfuller(row, maxlag=maxlag, regression=regression, autolag=autolag) for autolag 'AIC' or None.'''
+    if regression not in REGRESSIONS:
+        raise ValueError(f'regression must be one of {REGRESSIONS}')
+    series = np.atleast_2d(np.asarray(series, dtype=np.float64))
+    count, length = series.shape
+    ntrend = 1 if regression == 'c' else 0
+    maxlag = default_maxlag(length, ntrend) if maxlag is None else maxlag
+
+    if autolag is None:
+        used_lags = np.full(count, maxlag)
+    elif autolag.lower() == 'aic':
+        # Every lag order on the common maxlag sample from one factorisation
+        R, nobs = _factorise(series, maxlag, regression)
+        columns = maxlag + 1
+        # ssr with the first m columns = R_yy^2 + sum of the squared response entries of R below row m
+        tail = np.cumsum((R[:, :columns, columns] ** 2)[:, ::-1], axis=1)[:, ::-1]
+        ssr = (R[:, columns, columns] ** 2)[:, None] + np.concatenate([tail[:, 1:], np.zeros((count, 1))], axis=1)
+        k = np.arange(1, columns + 1) + ntrend
+        with np.errstate(divide='ignore'):
+            aic = nobs * (np.log(2 * np.pi) + np.log(ssr / nobs) + 1) + 2 * k
+        used_lags = np.argmin(aic, axis=1)
+    else:
+        raise ValueError("autolag must be 'AIC' or None")
+
+    stats = np.empty(count)
+    nobs_used = np.empty(count, dtype=int)
+    for lag in np.unique(used_lags):
+        rows = np.flatnonzero(used_lags == lag)
+        R, nobs = _factorise(series[rows], lag, regression)
+        columns = lag + 1
+        R_x, z = R[:, :columns, :columns], R[:, :columns, columns]
+        beta = np.linalg.solve(R_x, z[..., None])[:, 0, 0]
+        unit = np.broadcast_to(np.eye(columns)[:, :1], (len(rows), columns, 1))
+        inverse_00 = np.sum(np.linalg.solve(np.swapaxes(R_x, 1, 2), unit)[..., 0] ** 2, axis=1)
+        ssr = R[:, columns, columns] ** 2
+        stats[rows] = beta / np.sqrt(ssr / (nobs - columns - ntrend) * inverse_00)
+        nobs_used[rows] = nobs
+
+    return stats, mackinnonp(stats, regression=regression, N=1), used_lags, nobs_used
+
+def adf_many(spreads: list, regression: str = 'c') -> list:
+    '''[(adf_stat, pvalue, error)] for a list of 1-d spreads of any lengths.
+    Spreads of equal length share one adf_batch call; a batch that fails, and constant spreads,
+    go through adfuller one at a time so the error is reported per spread.'''
+    results = [None] * len(spreads)
+    groups = {}
+    for position, spread in enumerate(spreads):
+        groups.setdefault(len(spread), []).append(position)
+
+    for length, positions in groups.items():
+        try:
+            block = np.asarray([spreads[p] for p in positions], dtype=np.float64).reshape(len(positions), length)
+            constant = block.max(axis=1) == block.min(axis=1)
+            batched = [p for p, c in zip(positions, constant) if not c]
+            if batched:
+                stats, pvalues, _, _ = adf_batch(block[~constant], regression=regression)
+                for position, stat, pvalue in zip(batched, stats, pvalues):
+                    results[position] = (float(stat), float(pvalue), None)
+        except Exception:
+            pass
+
+        for position in positions:
+            if results[position] is not None:
+                continue
+            try:
+                stat, pvalue = adfuller(spreads[position], regression=regression)[:2]
+                results[position] = (stat, pvalue, None)
+            except Exception as e:
+                results[position] = (None, None, str(e))
+    return results
@@ -0,0 +1,45 @@
+'''Persisted checkpoints for the monthly pair test windows.
+
+A work unit is one stage of one window. A stage is marked done only after its results are
+committed, so a crash or timeout resumes at the first unfinished stage of every window. Each
+window has its own JSON file, written atomically, so windows running in separate processes never
+touch the same file.
+'''
+from datetime import datetime, timezone
+import json
+import os
+
+# Stages of a window, in the order they have to run
+STAGES = ('coint', 'adf', 'trading_pairs')
+
+def window_key(trainset_start, trainset_end) -> str:
+    return f'{trainset_start:%Y-%m-%d}_{trainset_end:%Y-%m-%d}'
+
+class WindowCheckpoint:
+    def __init__(self, root: str, trainset_start, trainset_end):
+        self.key = window_key(trainset_start, trainset_end)
+        self.path = os.path.join(root, f'window={self.key}.json')
+        os.makedirs(root, exist_ok=True)
+        self.state = self.load()
+
+    def load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {'window': self.key, 'stages': {}}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def done(self, stage: str) -> bool:
+        return stage in self.state['stages']
+
+    def pending(self) -> list:
+        return [stage for stage in STAGES if not self.done(stage)]
+
+    def mark(self, stage: str, **info):
+        # info is kept alongside the finish time, e.g. rows written
+        if stage not in STAGES:
+            raise ValueError(f'stage must be one of {STAGES}')
+        self.state['stages'][stage] = {'finished_at': datetime.now(timezone.utc).isoformat(), **info}
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,93 @@
+'''Parallel Engle-Granger cointegration engine for the monthly pair tests.
+
+The symbols x days close matrix is copied once into shared memory. Worker processes attach to it
+in their initializer, so a task is only a list of (i, j) row index pairs and a result batch
+comes back, nothing per pair is pickled. Each task runs the batched Engle-Granger kernel from
+batched_coint; pairs with gaps are aligned on the days where both legs have a close (inner join),
+which is what the per-pair filtering in the old loop was trying to do.
+
+pairs may be any iterable, e.g. the tile generator of pair_tiles. Batches are cut from it lazily
+and only a few per worker are in flight, so memory does not grow with the number of pairs.
+'''
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from itertools import chain, islice
+from multiprocessing import shared_memory
+import multiprocessing
+import logging
+import os
+import numpy as np
+from batched_coint import coint_batch
+
+# Pairs per task, large enough for the batched kernel to amortise its setup
+DEFAULT_BATCH_SIZE = 2048
+
+# Batches submitted per worker ahead of the results being consumed
+IN_FLIGHT_PER_WORKER = 2
+
+# Populated in each worker by _init_worker, or in-process for serial runs
+_matrix = None
+_shm = None
+
+def _attach(name: str, shape: tuple, dtype: str):
+    global _matrix, _shm
+    _shm = shared_memory.SharedMemory(name=name)
+    _matrix = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_shm.buf)
+
+def _init_worker(name: str, shape: tuple, dtype: str):
+    _attach(name, shape, dtype)
+
+def _test_batch(pairs: list) -> list:
+    return coint_batch(_matrix, pairs)
+
+def default_start_method():
+    # fork needs no import guard in the calling script; where only spawn exists the pool is skipped
+    return 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+
+def iter_batches(pairs, batch_size: int):
+    pairs = iter(pairs)
+    while True:
+        batch = list(islice(pairs, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def run_coint_tests(matrix: np.ndarray, pairs, max_workers: int = None, batch_size: int = DEFAULT_BATCH_SIZE, start_method: str = 'default'):
+    '''Yield result batches [(i, j, coint_t, pvalue, error)] for the (i, j) row pairs of matrix.
+    matrix is symbols x days float64 with NaN where a symbol has no close.'''
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    max_workers = max_workers or os.cpu_count()
+    start_method = default_start_method() if start_method == 'default' else start_method
+    batches = iter_batches(pairs, batch_size)
+    # Two batches are peeked to decide whether a pool is worth starting
+    head = list(islice(batches, 2))
+
+    if max_workers <= 1 or start_method is None or len(head) <= 1:
+        global _matrix
+        _matrix = matrix
+        try:
+            for batch in chain(head, batches):
+                yield _test_batch(batch)
+        finally:
+            _matrix = None
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    try:
+        shared = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)
+        shared[:] = matrix
+        del shared
+        context = multiprocessing.get_context(start_method)
+        logging.info(f'Cointegration engine | {len(matrix)} symbols | batches of {batch_size} pairs | {max_workers} workers')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker, initargs=(shm.name, matrix.shape, matrix.dtype.str)) as executor:
+            in_flight = set()
+            for batch in chain(head, batches):
+                in_flight.add(executor.submit(_test_batch, batch))
+                if len(in_flight) >= max_workers * IN_FLIGHT_PER_WORKER:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in as_completed(in_flight):
+                yield future.result()
+    finally:
+        shm.close()
+        shm.unlink()
@@ -1,16 +1,76 @@
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from binance.um_futures import UMFutures
 from binance.error import ClientError
-import requests
 import pytz
 import logging
-from sqlalchemy import create_engine, func
-from sqlalchemy.exc import IntegrityError
+import threading
+import time
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from mapped_model import Asset, AssetPrice
+from exchange_info import load_exchange_info, upsert_assets
+from asset_cache import load_asset_cache
+from backfill_planner import plan_backfill
+from price_ingest import PriceWriter
+from watermarks import load_watermarks, rebuild_watermarks, load_db_range
 
-def data_fetch(start: str, end: str, connection_string):
-    client = UMFutures()
+# Binance USD-M IP limit is 2400 weight per minute, leave headroom for the execution model
+DEFAULT_WEIGHT_PER_MINUTE = 1200
+DEFAULT_FETCH_WORKERS = 8
+
+def kline_weight(limit: int) -> int:
+    # Request weight of /fapi/v1/continuousKlines depends on the limit parameter
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+class WeightBudget:
+    # Sliding one minute window of request weight shared by all fetch threads
+    def __init__(self, weight_per_minute: int):
+        self.weight_per_minute = weight_per_minute
+        self._spent = deque()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: int):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._spent and now - self._spent[0][0] >= 60:
+                    self._used -= self._spent.popleft()[1]
+                if self._used + weight <= self.weight_per_minute or not self._spent:
+                    self._spent.append((now, weight))
+                    self._used += weight
+                    return
+                wait = 60 - (now - self._spent[0][0])
+            time.sleep(wait)
+
+def fetch_klines_concurrently(jobs: list, interval: str, max_workers: int = DEFAULT_FETCH_WORKERS, weight_per_minute: int = DEFAULT_WEIGHT_PER_MINUTE, limit: int = 1000):
+    '''Fetch klines for many symbols at once and yield (job, future) in completion order.
+    jobs are (symbol, asset_id, start_time, end_time) tuples. Calling future.result() re-raises any fetch error so the
+    single writer consuming this generator keeps the per symbol error handling.'''
+    budget = WeightBudget(weight_per_minute)
+    weight = kline_weight(limit)
+    local = threading.local()
+
+    def fetch(symbol, start_time, end_time):
+        # one client per thread, the underlying requests session is not shared across threads
+        if not hasattr(local, 'client'):
+            local.client = UMFutures()
+        budget.acquire(weight)
+        return local.client.continuous_klines(pair=symbol, contractType='PERPETUAL', interval=interval, startTime=start_time, endTime=end_time, limit=limit)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, job[0], job[2], job[3]): job for job in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future
+
+def data_fetch(start: str, end: str, connection_string, max_workers: int = DEFAULT_FETCH_WORKERS, weight_per_minute: int = DEFAULT_WEIGHT_PER_MINUTE, price_store_dir: str = None):
     today = datetime.now().date()
     
     try:
@@ -23,116 +83,75 @@ def data_fetch(start: str, end: str, connection_string):
         logging.error(f'Error with database connection | {e}')
 
     try:
-        # Get list of all symbols on Binance
-        response = requests.get('https://fapi.binance.com/fapi/v1/exchangeInfo')
-        data = response.json()
+        # Get list of all symbols on Binance, served from the on-disk snapshot while it is fresh
+        snapshot = load_exchange_info()
     except Exception as e:
         logging.error(f'Error with binance connection | {e}')
         
     try:
-        symbols = [item['symbol'] for item in data['symbols'] if item['status'] == 'TRADING']
-        trading = 1
-        existing_symbols = session.query(Asset.symbol).all()
-
-        for symbol in symbols:
-            if (symbol,) in existing_symbols:
-                logging.info(f'Symbol exists: {symbol}')
-                continue
-            else:
-                try:
-                    logging.info(f'Inserting asset {symbol} into asset table')
-                    symbol_data = next((item for item in data['symbols'] if item['symbol'] == symbol), None)
-                    lot_size_filter = next((item for item in symbol_data['filters'] if item['filterType'] == 'LOT_SIZE'), None)    
-                    symbol_lot_size = float(lot_size_filter['minQty'])
-                    min_notional_filter = next((item for item in symbol_data['filters'] if item['filterType'] == 'MIN_NOTIONAL'), None)
-                    symbol_min_notional = float(min_notional_filter['notional'])
-                    new_asset = Asset(symbol=symbol, min_lot_size=symbol_lot_size, trading=trading, min_notional=symbol_min_notional)
-                    session.add(new_asset)
-                except IntegrityError:
-                    session.rollback()
-                    logging.info(f"Symbol {symbol} already inserted by another process")
-                except Exception as e:
-                    session.rollback()
-                    logging.error(f"Error inserting {symbol}: {e}")
-        session.commit()
+        symbols = snapshot.trading_symbols()
+        logging.info(f'{len(symbols)} TRADING symbols in exchangeInfo')
+
+        # Insert new symbols, refresh lot size / min notional and flag delisted symbols in one statement
+        try:
+            upsert_assets(session, snapshot)
+            # Lot sizes may have changed, execution in this worker must not size from the old rows
+            load_asset_cache(engine, refresh=True)
+        except Exception as e:
+            session.rollback()
+            logging.error(f'Error upserting assets: {e}')
         
         interval = '1d'
         desired_timezone = pytz.timezone('UTC')
         
         start_string = f'{start} 00:00:00 UTC'
         start_date_obj = datetime.strptime(start_string, '%Y-%m-%d %H:%M:%S %Z').replace(tzinfo=desired_timezone)
-        start_time = int(start_date_obj.timestamp() * 1000)
         
         end_string = f'{end} 23:59:59 UTC'
         end_date_obj = datetime.strptime(end_string, '%Y-%m-%d %H:%M:%S %Z').replace(tzinfo=desired_timezone)
-        end_time = int(end_date_obj.timestamp() * 1000)
-
-        for symbol in symbols:
-            asset = session.query(Asset).filter(Asset.symbol == symbol).first()
-            if asset:
-                asset_id = asset.id
-                logging.info(f'asset_id: {asset_id}')
-                date_range_check = (
-                    session.query(func.min(AssetPrice.open_time), func.max(AssetPrice.close_time))
-                    .filter(AssetPrice.asset_id == asset_id)
-                    .first()
-                )
-                date_range_start, date_range_end = date_range_check
-                logging.info(f'Date range start: {date_range_start}')
-                logging.info(f'Date range end: {date_range_end}')
-                if date_range_start is None or date_range_start > start_date_obj or date_range_end < end_date_obj:
-                    try:
-                        data = client.continuous_klines(pair=symbol, contractType='PERPETUAL', interval=interval, startTime=start_time, endTime=end_time, limit=1000)
-                        bars_fetched = len(data)
-                        logging.info(f'No. of Candles Fetched: {bars_fetched}')
-
-                        data_to_insert = []
-                        for row in data:
-                            open_time_sast = datetime.utcfromtimestamp(row[0] / 1000)
-                            open_time = open_time_sast.replace(tzinfo=pytz.utc).astimezone(desired_timezone)
-                            close_time_sast = datetime.utcfromtimestamp(row[6] / 1000)
-                            close_time = close_time_sast.replace(tzinfo=pytz.utc).astimezone(desired_timezone)
-
-                            data_to_insert.append({
-                                'asset_id': asset_id,
-                                'open_time': open_time,
-                                'open': row[1],
-                                'high': row[2],
-                                'low': row[3],
-                                'close': row[4],
-                                'volume': row[5],
-                                'close_time': close_time
-                                })
-                            
-                        try:
-                            session.bulk_insert_mappings(AssetPrice, data_to_insert)
-                            session.commit()
-                            logging.info(f'Executing {symbol} data for ingestion into asset_price')
-                        except IntegrityError as e:
-                            session.rollback()
-                            logging.error(f'Integrity Error while inserting data: {e}')
-                        except Exception as e:
-                            session.rollback()
-                            logging.error(f'Error while inserting data: {e}')
-                    except IndexError as e:
-                        logging.error(f'Index Error: {e}')
-                    except ClientError as e:
-                        logging.error(f'Client Error: {e}')
-                    except TypeError as e:
-                        logging.error(f'Type Error: {e}')
-                    except Exception as e:
-                        logging.error(f'Unexpected Error: {e}')
-                        session.rollback()
-                else:
-                    logging.info('Record exists.')
-            else:
-                logging.info(f'No matching records found for symbol: {symbol}')
-
-        date_range = (
-            session.query(func.min(AssetPrice.open_time).label('date_range_start'), func.max(AssetPrice.close_time).label('date_range_end'))
-            .one()
-        )
-        db_opencandle, db_closecandle = date_range.date_range_start, date_range.date_range_end
+
+        # symbol -> (asset_id, first_open, last_close, bars) for the whole universe in one query
+        watermarks = load_watermarks(session)
+        if not any(watermark.first_open for watermark in watermarks.values()):
+            logging.info('asset_watermark is empty, rebuilding from asset_price')
+            rebuild_watermarks(session)
+            watermarks = load_watermarks(session)
+
+        # Plan exactly the missing bars for every symbol in one query, split into 1000 bar pages
+        jobs = plan_backfill(session, symbols, start_date_obj, end_date_obj, interval, watermarks=watermarks)
+
+        logging.info(f'Fetching {len(jobs)} kline pages | workers: {max_workers} | weight/min: {weight_per_minute}')
+
+        # Results are buffered by this thread only and merged into asset_price in one transaction at the end
+        writer = PriceWriter(on_conflict='update')
+        for (symbol, asset_id, start_time, end_time), future in fetch_klines_concurrently(jobs, interval, max_workers, weight_per_minute):
+            try:
+                data = future.result()
+                bars_fetched = writer.add(asset_id, data)
+                logging.info(f'{symbol} | No. of Candles Fetched: {bars_fetched}')
+            except IndexError as e:
+                logging.error(f'Index Error: {e}')
+            except ClientError as e:
+                logging.error(f'Client Error: {e}')
+            except TypeError as e:
+                logging.error(f'Type Error: {e}')
+            except Exception as e:
+                logging.error(f'Unexpected Error: {e}')
+
+        try:
+            writer.flush(engine)
+        except Exception as e:
+            logging.error(f'Error while inserting data: {e}')
+
+        # Keep the local columnar mirror in step with asset_price (research machines only, needs pyarrow)
+        if price_store_dir:
+            try:
+                from price_store import sync_price_store
+                sync_price_store(engine, price_store_dir)
+            except Exception as e:
+                logging.error(f'Error syncing price store | {e}')
+
+        db_opencandle, db_closecandle = load_db_range(session)
 
         logging.info('-' * 50)
         logging.info(f"DB date range | {db_opencandle} --> {db_closecandle}")
@@ -22,6 +22,16 @@ CREATE TABLE asset_price (
 
 CREATE INDEX ON asset_price (asset_id, open_time DESC);
 
+-- Stored bar range per asset, maintained by data_fetch in the same transaction as the price merge
+CREATE TABLE asset_watermark (
+    asset_id INTEGER PRIMARY KEY,
+    first_open TIMESTAMPTZ NOT NULL,
+    last_close TIMESTAMPTZ NOT NULL,
+    bars INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    CONSTRAINT fk_asset FOREIGN KEY (asset_id) REFERENCES asset (id)
+);
+
 -- Table to store results from the cointegration test for ml
 CREATE TABLE coint_test_results (
     pair TEXT NOT NULL,
@@ -82,6 +92,37 @@ CREATE TABLE trading_pairs (
     CONSTRAINT fk_symbol_2 FOREIGN KEY (symbol_2_id) REFERENCES asset (id)
 );
 
+-- Distributed pair testing (pair_workers.py): the coordinator stores each window's universe and
+-- queues pair shards, workers claim them with FOR UPDATE SKIP LOCKED
+CREATE TABLE pair_test_windows (
+    trainset_start TIMESTAMPTZ NOT NULL,
+    trainset_end TIMESTAMPTZ NOT NULL,
+    symbols JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    adf_queued_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    PRIMARY KEY (trainset_start, trainset_end)
+);
+
+CREATE TABLE pair_test_shards (
+    id BIGSERIAL PRIMARY KEY,
+    trainset_start TIMESTAMPTZ NOT NULL,
+    trainset_end TIMESTAMPTZ NOT NULL,
+    stage TEXT NOT NULL,
+    shard_no INTEGER NOT NULL,
+    pairs JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_by TEXT,
+    claimed_at TIMESTAMPTZ,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    completed_at TIMESTAMPTZ,
+    error TEXT,
+    UNIQUE (trainset_start, trainset_end, stage, shard_no),
+    CONSTRAINT fk_window FOREIGN KEY (trainset_start, trainset_end) REFERENCES pair_test_windows (trainset_start, trainset_end)
+);
+
+CREATE INDEX pair_test_shards_open_idx ON pair_test_shards (id) WHERE status <> 'done';
+
 CREATE TABLE positions (
     date TIMESTAMPTZ NOT NULL,
     positions JSONB,
@@ -124,4 +165,7 @@ CREATE TABLE orders (
     update_time TIMESTAMPTZ,
     PRIMARY KEY (order_id),
     CONSTRAINT fk_symbol FOREIGN KEY (symbol) REFERENCES asset (symbol)
-);
\ No newline at end of file
+);
+
+-- Latest order per pair leg (DISTINCT ON (pair, symbol) in order_state.py) without scanning the order history
+CREATE INDEX orders_pair_symbol_update_time_idx ON orders (pair, symbol, update_time DESC);
\ No newline at end of file
@@ -0,0 +1,51 @@
+
+-- Brings a database created from an older create_production_tables.sql up to date.
+-- Every statement is idempotent, safe to run on every deploy:
+--   psql "$DATABASE_URL" -f db/migrate.sql
+
+-- Stored bar range per asset, maintained by data_fetch in the same transaction as the price merge.
+-- data_fetch seeds it from asset_price on its first run after this table is created.
+CREATE TABLE IF NOT EXISTS asset_watermark (
+    asset_id INTEGER PRIMARY KEY,
+    first_open TIMESTAMPTZ NOT NULL,
+    last_close TIMESTAMPTZ NOT NULL,
+    bars INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    CONSTRAINT fk_asset FOREIGN KEY (asset_id) REFERENCES asset (id)
+);
+
+-- Distributed and time sliced pair testing (pair_workers.py, pair_test_chunks.py)
+CREATE TABLE IF NOT EXISTS pair_test_windows (
+    trainset_start TIMESTAMPTZ NOT NULL,
+    trainset_end TIMESTAMPTZ NOT NULL,
+    symbols JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    adf_queued_at TIMESTAMPTZ,
+    completed_at TIMESTAMPTZ,
+    PRIMARY KEY (trainset_start, trainset_end)
+);
+
+ALTER TABLE pair_test_windows ADD COLUMN IF NOT EXISTS adf_queued_at TIMESTAMPTZ;
+ALTER TABLE pair_test_windows ADD COLUMN IF NOT EXISTS completed_at TIMESTAMPTZ;
+
+CREATE TABLE IF NOT EXISTS pair_test_shards (
+    id BIGSERIAL PRIMARY KEY,
+    trainset_start TIMESTAMPTZ NOT NULL,
+    trainset_end TIMESTAMPTZ NOT NULL,
+    stage TEXT NOT NULL,
+    shard_no INTEGER NOT NULL,
+    pairs JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_by TEXT,
+    claimed_at TIMESTAMPTZ,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    completed_at TIMESTAMPTZ,
+    error TEXT,
+    UNIQUE (trainset_start, trainset_end, stage, shard_no),
+    CONSTRAINT fk_window FOREIGN KEY (trainset_start, trainset_end) REFERENCES pair_test_windows (trainset_start, trainset_end)
+);
+
+CREATE INDEX IF NOT EXISTS pair_test_shards_open_idx ON pair_test_shards (id) WHERE status <> 'done';
+
+-- Latest order per pair leg (order_state.py)
+CREATE INDEX IF NOT EXISTS orders_pair_symbol_update_time_idx ON orders (pair, symbol, update_time DESC);
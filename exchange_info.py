@@ -0,0 +1,113 @@
+from collections import namedtuple
+import json
+import logging
+import os
+import tempfile
+import time
+import requests
+from sqlalchemy import text
+
+EXCHANGE_INFO_URL = 'https://fapi.binance.com/fapi/v1/exchangeInfo'
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'binance_fapi_exchange_info.json')
+DEFAULT_TTL_SECONDS = 60 * 60
+
+# Filter values are kept as the exchange's decimal strings so they land in NUMERIC columns exactly
+SymbolInfo = namedtuple('SymbolInfo', ['symbol', 'status', 'min_lot_size', 'min_notional'])
+
+class ExchangeInfoSnapshot:
+    # exchangeInfo indexed by symbol, each symbol's LOT_SIZE / MIN_NOTIONAL filters looked up by filterType
+    def __init__(self, data: dict, fetched_at: float):
+        self.fetched_at = fetched_at
+        self.symbols = {}
+        self.listed = {item['symbol'] for item in data['symbols']}
+        for item in data['symbols']:
+            filters = {f['filterType']: f for f in item.get('filters', [])}
+            lot_size = filters.get('LOT_SIZE')
+            min_notional = filters.get('MIN_NOTIONAL')
+            if lot_size is None or min_notional is None:
+                logging.info(f"Skipping {item['symbol']}, missing LOT_SIZE or MIN_NOTIONAL filter")
+                continue
+            self.symbols[item['symbol']] = SymbolInfo(item['symbol'], item['status'], lot_size['minQty'], min_notional['notional'])
+
+    def trading_symbols(self) -> list:
+        return [symbol for symbol, info in self.symbols.items() if info.status == 'TRADING']
+
+    def __getitem__(self, symbol):
+        return self.symbols[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+def load_exchange_info(cache_path: str = DEFAULT_CACHE_PATH, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> ExchangeInfoSnapshot:
+    # Serve from the on-disk copy while it is younger than ttl_seconds, otherwise refetch and rewrite it
+    if cache_path and os.path.exists(cache_path):
+        fetched_at = os.path.getmtime(cache_path)
+        if time.time() - fetched_at < ttl_seconds:
+            try:
+                with open(cache_path) as f:
+                    data = json.load(f)
+                logging.info(f'Using cached exchangeInfo from {cache_path}')
+                return ExchangeInfoSnapshot(data, fetched_at)
+            except (OSError, ValueError) as e:
+                logging.error(f'Error reading cached exchangeInfo | {e}')
+
+    response = requests.get(EXCHANGE_INFO_URL)
+    response.raise_for_status()
+    data = response.json()
+    fetched_at = time.time()
+
+    if cache_path:
+        try:
+            # write then rename so a concurrent reader never sees a half written file
+            tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.error(f'Error caching exchangeInfo | {e}')
+
+    return ExchangeInfoSnapshot(data, fetched_at)
+
+# One statement for the whole universe: upsert every listed symbol (refreshing filters and status)
+# and flip trading off for assets that are no longer listed at all.
+upsert_assets_query = text('''
+    WITH snapshot AS (
+        SELECT *
+        FROM unnest(CAST(:symbols AS TEXT[]), CAST(:min_lot_sizes AS NUMERIC[]), CAST(:trading AS INTEGER[]), CAST(:min_notionals AS NUMERIC[]))
+            AS s(symbol, min_lot_size, trading, min_notional)
+    ),
+    upserted AS (
+        INSERT INTO asset (symbol, min_lot_size, trading, min_notional)
+        SELECT symbol, min_lot_size, trading, min_notional FROM snapshot
+        ON CONFLICT (symbol) DO UPDATE
+        SET min_lot_size = EXCLUDED.min_lot_size,
+            trading = EXCLUDED.trading,
+            min_notional = EXCLUDED.min_notional
+        WHERE (asset.min_lot_size, asset.trading, asset.min_notional)
+            IS DISTINCT FROM (EXCLUDED.min_lot_size, EXCLUDED.trading, EXCLUDED.min_notional)
+        RETURNING (xmax = 0) AS inserted
+    ),
+    delisted AS (
+        UPDATE asset SET trading = 0
+        WHERE trading = 1 AND symbol <> ALL(CAST(:listed AS TEXT[]))
+        RETURNING symbol
+    )
+    SELECT
+        (SELECT COUNT(*) FROM upserted WHERE inserted) AS inserted,
+        (SELECT COUNT(*) FROM upserted WHERE NOT inserted) AS updated,
+        (SELECT COUNT(*) FROM delisted) AS delisted;
+''')
+
+def upsert_assets(session, snapshot: ExchangeInfoSnapshot):
+    infos = list(snapshot.symbols.values())
+    params = {
+        'symbols': [info.symbol for info in infos],
+        'min_lot_sizes': [info.min_lot_size for info in infos],
+        'trading': [1 if info.status == 'TRADING' else 0 for info in infos],
+        'min_notionals': [info.min_notional for info in infos],
+        'listed': sorted(snapshot.listed),
+    }
+    inserted, updated, delisted = session.execute(upsert_assets_query, params).one()
+    session.commit()
+    logging.info(f'Asset upsert | {inserted} inserted | {updated} updated | {delisted} delisted')
+    return inserted, updated, delisted
@@ -8,6 +8,11 @@ from binance.um_futures import UMFutures
 from binance.error import ClientError
 from decimal import Decimal, ROUND_UP, ROUND_HALF_EVEN
 import logging
+from signals import spread_signals
+from price_data import load_close_matrix
+from market_snapshot import load_market_snapshot
+from asset_cache import load_asset_cache
+from order_state import load_order_state
 
 def execution_model(binance_api: str, binance_secret: str, connection_string):
     # Get server timestamp
@@ -53,6 +58,8 @@ def execution_model(binance_api: str, binance_secret: str, connection_string):
         SELECT 
             asset1.symbol AS symbol_1,
             asset2.symbol AS symbol_2,
+            tp.symbol_1_id,
+            tp.symbol_2_id,
             tp.trainset_end
         FROM trading_pairs AS tp
         JOIN asset AS asset1 ON tp.symbol_1_id = asset1.id
@@ -62,6 +69,20 @@ def execution_model(binance_api: str, binance_secret: str, connection_string):
 
     trading_pairs = pd.read_sql(trading_pairs_query, engine, params={'trainset_end': backdata_end})
 
+    # Closes of every pair leg in one query, date x symbol. Each pair reads its two columns.
+    leg_ids = sorted(set(trading_pairs['symbol_1_id']) | set(trading_pairs['symbol_2_id']))
+    closes = load_close_matrix(engine, leg_ids, backdata_start, yesterday)
+    logging.info(f'Loaded closes | {closes.shape[1]} symbols x {closes.shape[0]} days')
+
+    # Last price of every symbol in one call, used to size every pair of the run
+    market = load_market_snapshot(client)
+
+    # Lot size and min notional of every asset, one query per TTL instead of two per pair
+    assets = load_asset_cache(engine)
+
+    # Latest order of every leg of every pair in one query
+    order_state = load_order_state(engine, [f'{symbol_1}-{symbol_2}' for symbol_1, symbol_2 in zip(trading_pairs['symbol_1'], trading_pairs['symbol_2'])])
+
     # Initialize a list to store backtest statistics
     backtest_stats = []
 
@@ -99,40 +120,13 @@ def execution_model(binance_api: str, binance_secret: str, connection_string):
         symbol_1 = pair_1
         symbol_2 = pair_2
 
-        symbol_1_id_query = text('SELECT id FROM asset WHERE symbol = :symbol_1')
-        symbol_2_id_query = text('SELECT id FROM asset WHERE symbol = :symbol_2')
-
-        # with engine.connect() as connection:
-        #     symbol_1_id_result = connection.execute(symbol_1_id_query, {'symbol_1': symbol_1}).fetchone()
-        #     symbol_2_id_result = connection.execute(symbol_2_id_query, {'symbol_2': symbol_2}).fetchone()
-
-        # symbol_1_id = symbol_1_id_result[0] 
-        # symbol_2_id = symbol_2_id_result[0]
-
-        pair_data_query = text(f'''
-            SELECT
-                ap_symbol_1.open_time AS date,
-                ap_symbol_1.close AS close_{symbol_1},
-                ap_symbol_2.close AS close_{symbol_2}
-            FROM
-                asset_price AS ap_symbol_1
-            INNER JOIN
-                asset AS a_symbol_1 ON ap_symbol_1.asset_id = a_symbol_1.id
-            INNER JOIN
-                asset_price AS ap_symbol_2
-                ON ap_symbol_1.open_time = ap_symbol_2.open_time
-                AND ap_symbol_1.asset_id <> ap_symbol_2.asset_id
-            INNER JOIN
-                asset AS a_symbol_2 ON ap_symbol_2.asset_id = a_symbol_2.id
-            WHERE
-                a_symbol_1.symbol = :symbol_1
-                    AND a_symbol_2.symbol = :symbol_2
-                    AND ap_symbol_1.open_time BETWEEN :backdata_start AND :yesterday
-            ORDER BY
-                ap_symbol_1.open_time;
-        ''')
-
-        df = pd.read_sql_query(pair_data_query, engine, params={'symbol_1': symbol_1, 'symbol_2': symbol_2, 'backdata_start': backdata_start, 'yesterday': yesterday})
+        # Days where both legs have a close, same rows as the old per pair self join on open_time
+        pair_closes = closes.reindex(columns=[symbol_1, symbol_2]).dropna()
+        df = pd.DataFrame({
+            'date': pair_closes.index,
+            f'close_{(pair_1).lower()}': pair_closes[symbol_1].to_numpy(),
+            f'close_{(pair_2).lower()}': pair_closes[symbol_2].to_numpy(),
+        })
 
         # Determine the hedge ratio on the training set using OLS regression
         model = OLS(df[f'close_{(pair_1).lower()}'], df[f'close_{(pair_2).lower()}'])
@@ -166,46 +160,14 @@ def execution_model(binance_api: str, binance_secret: str, connection_string):
         df['entry_threshold'] = entry_threshold
         df['exit_threshold'] = exit_threshold
         
-        # Initialize columns for trading positions for both assets, including long and short positions
-        df[f'pos_{(pair_1).lower()}_long'] = 0
-        df[f'pos_{(pair_2).lower()}_long'] = 0
-        df[f'pos_{(pair_1).lower()}_short'] = 0
-        df[f'pos_{(pair_2).lower()}_short'] = 0
-
-        df['in_position'] = 0
-        # Set trading positions based on z-score conditions
-        for i in range(1, len(df)):
-            zscore = df.at[i-1,'zscore']
-            entry_threshold = df.at[i-1, 'entry_threshold']
-            exit_threshold = df.at[i-1, 'exit_threshold']
-
-            if df.at[i, 'in_position'] == 0 and zscore <= -entry_threshold:
-                df.loc[i:, (f'pos_{pair_1.lower()}_long', f'pos_{pair_2.lower()}_short')] = [1, -1]
-                df.loc[i:, 'in_position'] = 1
-                continue
-
-            if df.at[i, 'in_position'] == 1 and zscore >= exit_threshold:
-                df.loc[i:, (f'pos_{pair_1.lower()}_long', f'pos_{pair_2.lower()}_short')] = 0
-                df.loc[i:, 'in_position']  = 0 
-                continue
-
-            if df.at[i, 'in_position'] == 0 and zscore >= entry_threshold:
-                df.loc[i:, (f'pos_{(pair_1).lower()}_short', f'pos_{(pair_2).lower()}_long')] = [-1, 1]
-                df.loc[i:, 'in_position']  = -1
-                continue
-
-            if df.at[i, 'in_position'] == -1 and zscore <= -exit_threshold:
-                df.loc[i:, (f'pos_{(pair_1).lower()}_short', f'pos_{(pair_2).lower()}_long')] = 0 
-                df.loc[i:, 'in_position']  = 0 
-                continue
-            
-        # Spread position | Extract long and short trading positions for both assets
-        long_spread = df.loc[:, (f'pos_{(pair_1).lower()}_long', f'pos_{(pair_2).lower()}_short')]
-        short_spread = df.loc[:, (f'pos_{(pair_1).lower()}_short', f'pos_{(pair_2).lower()}_long')]
-        
-        # Calculate position change
-        spread_change = (long_spread != long_spread.shift(1)).any(axis=1) | (short_spread != short_spread.shift(1)).any(axis=1)
-        df['position_change'] = spread_change
+        # Trading positions for both assets from the z-score state machine, one linear pass (see signals.py)
+        signals = spread_signals(df['zscore'].to_numpy(), df['entry_threshold'].to_numpy(), df['exit_threshold'].to_numpy())
+        df[f'pos_{(pair_1).lower()}_long'] = signals['long_1']
+        df[f'pos_{(pair_2).lower()}_long'] = signals['long_2']
+        df[f'pos_{(pair_1).lower()}_short'] = signals['short_1']
+        df[f'pos_{(pair_2).lower()}_short'] = signals['short_2']
+        df['in_position'] = signals['in_position']
+        df['position_change'] = signals['position_change']
         
         logging.info('execution model ran up to trade execution')
         # -------------------
@@ -220,46 +182,20 @@ def execution_model(binance_api: str, binance_secret: str, connection_string):
         symbol_alloction_threshold = symbol_allocation * 1.15 # set to 15% based on log check that max excess above allocations was around 11.10
         symbol_alloction_threshold = Decimal(symbol_alloction_threshold).quantize(Decimal('0.00'), rounding=ROUND_HALF_EVEN)
 
-        # query all orders for this pair in this month
-        position_query = text('''
-            SELECT pair, symbol, update_time, orig_qty, status, spread, pair_order
-            FROM orders
-            WHERE pair = :pair_symbol
-            ORDER BY update_time ASC;
-        ''')
-
-        positions = pd.read_sql(position_query, engine, params={'pair_symbol': f'{symbol_1}-{symbol_2}'})
-
-        # get the current asset_price 
-        symbol_1_price = (client.ticker_price(f'{symbol_1}'))
-        symbol_1_price = Decimal(symbol_1_price['price'])
+        # latest order of each leg of this pair, from the state loaded for all pairs
+        positions = order_state[f'{symbol_1}-{symbol_2}']
 
-        symbol_2_price = (client.ticker_price(f'{symbol_2}'))
-        symbol_2_price = Decimal(symbol_2_price['price'])
+        # get the current asset_price, both legs from the same market snapshot
+        symbol_1_price = market[symbol_1]
+        symbol_2_price = market[symbol_2]
 
         # --------------------
-        # Query asset lot sizes
+        # Asset lot sizes, from the asset cache
         # --------------------
-        query_lot_size_1 = text('''
-            SELECT min_lot_size, min_notional
-            FROM asset
-            WHERE symbol = :symbol_1
-        ''')
-
-        query_lot_size_2 = text('''
-            SELECT min_lot_size, min_notional
-            FROM asset
-            WHERE symbol = :symbol_2
-        ''')
-
-        with engine.connect() as connection:
-            result_1 = connection.execute(query_lot_size_1, {'symbol_1': symbol_1}).fetchone()
-            symbol_1_lot_size = result_1[0]
-            symbol_1_min_notional = result_1[1]  # Extract min_notional value for symbol_1
-
-            result_2 = connection.execute(query_lot_size_2, {'symbol_2': symbol_2}).fetchone()
-            symbol_2_lot_size = result_2[0]
-            symbol_2_min_notional = result_2[1]  # Extract min_notional value for symbol_2         
+        symbol_1_lot_size = assets[symbol_1].min_lot_size
+        symbol_1_min_notional = assets[symbol_1].min_notional
+        symbol_2_lot_size = assets[symbol_2].min_lot_size
+        symbol_2_min_notional = assets[symbol_2].min_notional
 
         # Calculate lot_sizes based on minQty 
         if symbol_1_lot_size < 1:
@@ -80,3 +80,29 @@ def timer_trigger(myTimer: func.TimerRequest) -> None:
 
     logging.info(f'Function run complete.')
 
+
+### PAIR TESTING CONTINUATION
+# The monthly pair selection does not fit in one run, every 15 minutes a bounded slice of it is
+# processed and its progress kept in the work queue, until the latest window is complete
+@app.timer_trigger(
+    schedule="0 */15 * * * *", 
+    arg_name="pairTimer",
+    run_on_startup= False,
+    use_monitor= False 
+) 
+def pair_testing_trigger(pairTimer: func.TimerRequest) -> None:
+    from sqlalchemy import create_engine
+    from pair_test_chunks import run_time_slice, DEFAULT_SLICE_SECONDS
+    import os
+
+    try:
+        connection_string = os.getenv('SQLConnectionString')
+        engine = create_engine(f'postgresql://{connection_string}')
+        summary = run_time_slice(
+            engine,
+            slice_seconds= float(os.getenv('PAIR_SLICE_SECONDS', DEFAULT_SLICE_SECONDS))
+        )
+        logging.info(f'Pair testing slice | {summary}')
+
+    except Exception as e:
+        logging.error(f'Error running the pair testing slice | {e}')
@@ -0,0 +1,39 @@
+'''Price snapshot of every USDT-M futures symbol for one execution run.
+
+GET /fapi/v1/ticker/price without a symbol returns the last price of the whole market in one
+call, so every leg of every pair is sized against prices taken at the same moment instead of
+two sequential calls per pair.
+'''
+from decimal import Decimal
+import logging
+import time
+
+class MarketSnapshot:
+    # symbol -> last price as Decimal, exact like the exchange's string
+    def __init__(self, tickers: list, fetched_at: float, client=None):
+        self.fetched_at = fetched_at
+        self.prices = {ticker['symbol']: Decimal(ticker['price']) for ticker in tickers}
+        self.client = client
+
+    def __getitem__(self, symbol) -> Decimal:
+        price = self.prices.get(symbol)
+        if price is None and self.client is not None:
+            # Not in the snapshot (e.g. listed after it was taken), priced on its own
+            logging.info(f'{symbol} missing from the market snapshot, fetching its ticker')
+            price = self.prices[symbol] = Decimal(self.client.ticker_price(symbol)['price'])
+        if price is None:
+            raise KeyError(symbol)
+        return price
+
+    def __contains__(self, symbol):
+        return symbol in self.prices
+
+    def __len__(self):
+        return len(self.prices)
+
+def load_market_snapshot(client) -> MarketSnapshot:
+    started = time.monotonic()
+    tickers = client.ticker_price()
+    snapshot = MarketSnapshot(tickers, time.time(), client)
+    logging.info(f'Market snapshot | {len(snapshot)} symbols | {time.monotonic() - started:.2f}s')
+    return snapshot
@@ -0,0 +1,27 @@
+'''Latest order state of every active pair, loaded once per execution run.
+
+The position management in execution_model only looks at the latest order of each leg of a pair
+(its status, spread and orig_qty). DISTINCT ON (pair, symbol) returns exactly those rows for every
+pair in one query, served by the orders (pair, symbol, update_time DESC) index, so the cost no
+longer grows with the order history.
+'''
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+ORDER_STATE_COLUMNS = ['pair', 'symbol', 'update_time', 'orig_qty', 'status', 'spread', 'pair_order']
+
+latest_orders_query = text('''
+    SELECT DISTINCT ON (pair, symbol) pair, symbol, update_time, orig_qty, status, spread, pair_order
+    FROM orders
+    WHERE pair IN :pairs
+    ORDER BY pair, symbol, update_time DESC
+''').bindparams(bindparam('pairs', expanding=True))
+
+def load_order_state(engine, pairs: list) -> dict:
+    '''pair -> frame of the latest order of each leg, oldest first, the same last rows per pair and per
+    symbol as the full order history. Pairs without orders map to an empty frame.'''
+    frame = pd.read_sql(latest_orders_query, engine, params={'pairs': list(pairs)}) if pairs else pd.DataFrame(columns=ORDER_STATE_COLUMNS)
+    frame = frame.sort_values('update_time', kind='stable')
+    state = {pair: orders.reset_index(drop=True) for pair, orders in frame.groupby('pair', sort=False)}
+    empty = frame.iloc[0:0].reset_index(drop=True)
+    return {pair: state.get(pair, empty) for pair in pairs}
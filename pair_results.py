@@ -0,0 +1,100 @@
+'''Preloaded lookups for the monthly pair test stages.
+
+The coint, ADF and trading_pairs stages all key their tables on
+(symbol_1_id, symbol_2_id, trainset_start, trainset_end). Instead of resolving ids and checking
+for an existing row per pair, the asset ids and the keys already tested for a window are loaded
+once each and the skip logic runs against a dict and a set. Results go back through
+ResultWriter, which batches the inserts inside one transaction per stage.
+'''
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+from asset_cache import load_asset_cache
+
+# Tables keyed on (symbol_1_id, symbol_2_id, trainset_start, trainset_end) and the columns written to each
+RESULT_COLUMNS = {
+    'coint_test_results': ['pair', 'coint_test_stat', 'p_value', 'symbol_1_id', 'symbol_2_id', 'symbol_1', 'symbol_2', 'trainset_start', 'trainset_end', 'test_date'],
+    'adf_test_results': ['pair', 'adf_test_stat', 'p_value', 'stationary', 'symbol_1_id', 'symbol_2_id', 'symbol_1', 'symbol_2', 'trainset_start', 'trainset_end', 'test_date'],
+    'trading_pairs': ['symbol_1_id', 'symbol_2_id', 'trainset_start', 'trainset_end', 'test_date'],
+}
+RESULT_TABLES = tuple(RESULT_COLUMNS)
+
+# Rows per multi-row INSERT, one round trip each
+DEFAULT_WRITE_BATCH = 1000
+
+def load_symbol_ids(engine) -> dict:
+    # symbol -> asset id for every asset, served from the per-process asset cache
+    return load_asset_cache(engine).ids()
+
+def tested_keys_query(table: str):
+    if table not in RESULT_TABLES:
+        raise ValueError(f'table must be one of {RESULT_TABLES}')
+    return text(f'''
+        SELECT symbol_1_id, symbol_2_id
+        FROM {table}
+        WHERE trainset_start = :trainset_start
+            AND trainset_end = :trainset_end
+    ''')
+
+def load_tested_keys(engine, table: str, trainset_start, trainset_end) -> set:
+    # {(symbol_1_id, symbol_2_id)} already written to table for the window
+    with engine.connect() as connection:
+        rows = connection.execute(tested_keys_query(table), {'trainset_start': trainset_start, 'trainset_end': trainset_end}).fetchall()
+    return {(int(symbol_1_id), int(symbol_2_id)) for symbol_1_id, symbol_2_id in rows}
+
+def insert_query(table: str) -> str:
+    # Idempotent insert, rows already present for the window are left alone. Written for
+    # execute_values, which expands VALUES %s into one multi-row statement
+    if table not in RESULT_COLUMNS:
+        raise ValueError(f'table must be one of {RESULT_TABLES}')
+    return f'''
+        INSERT INTO {table} ({', '.join(RESULT_COLUMNS[table])})
+        VALUES %s
+        ON CONFLICT (symbol_1_id, symbol_2_id, trainset_start, trainset_end) DO NOTHING
+    '''
+
+class ResultWriter:
+    # Buffers result rows for one stage and sends every batch_size rows as one INSERT statement.
+    # Everything between __enter__ and __exit__ is one transaction, committed once at the end
+    # and rolled back if the stage raises.
+    def __init__(self, engine, table: str, batch_size: int = DEFAULT_WRITE_BATCH):
+        self.engine = engine
+        self.table = table
+        self.query = insert_query(table)
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+        self.connection = None
+        self.transaction = None
+
+    def __enter__(self):
+        self.connection = self.engine.connect()
+        self.transaction = self.connection.begin()
+        return self
+
+    def add(self, row: dict):
+        self.rows.append(tuple(row[column] for column in RESULT_COLUMNS[self.table]))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            # DBAPI cursor of the stage connection, so the batch stays inside the stage transaction.
+            # page_size covers the whole batch, executemany would be one round trip per row
+            cursor = self.connection.connection.cursor()
+            try:
+                execute_values(cursor, self.query, self.rows, page_size=len(self.rows))
+            finally:
+                cursor.close()
+            self.written += len(self.rows)
+            self.rows = []
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+                self.transaction.commit()
+            else:
+                self.transaction.rollback()
+        finally:
+            self.connection.close()
+        return False
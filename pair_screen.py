@@ -0,0 +1,62 @@
+'''Cheap pre-screen of candidate pairs before the Engle-Granger stage.
+
+One vectorised pass over the close matrix gives either the return correlation matrix or the
+distance matrix of normalised prices (sum of squared differences, as in the distance method of
+Gatev et al.). Only each symbol's top_k nearest neighbours and/or the pairs beyond a threshold
+are forwarded to the cointegration tests.
+'''
+import logging
+import numpy as np
+from price_matrix import PriceMatrix
+
+SCREEN_METHODS = ('correlation', 'distance')
+
+def correlation_scores(matrix: PriceMatrix, min_periods: int = 20) -> np.ndarray:
+    # Pearson correlation of daily log returns, pairwise complete observations. Higher is closer.
+    returns = np.log(matrix.frame()).diff()
+    return returns.corr(min_periods=min_periods).to_numpy()
+
+def distance_scores(matrix: PriceMatrix) -> np.ndarray:
+    # Negative SSD of prices normalised to their first close, on the days every symbol traded. Higher is closer.
+    values = matrix.values[:, ~np.isnan(matrix.values).any(axis=0)]
+    if values.shape[1] == 0:
+        return np.full((len(matrix), len(matrix)), np.nan)
+    normalised = values / values[:, :1]
+    squared = np.einsum('it,it->i', normalised, normalised)
+    distances = squared[:, None] + squared[None, :] - 2 * normalised @ normalised.T
+    return -np.maximum(distances, 0)
+
+def screen_pairs(matrix: PriceMatrix, symbol_pairs: list, method: str = 'correlation', top_k: int = None, threshold: float = None) -> list:
+    '''Subset of symbol_pairs worth a cointegration test, order preserved.
+    A pair survives when either leg is among the other's top_k neighbours, or when its score passes
+    threshold (correlation >= threshold, distance <= threshold). With neither set nothing is pruned.'''
+    if method not in SCREEN_METHODS:
+        raise ValueError(f'method must be one of {SCREEN_METHODS}')
+    if top_k is None and threshold is None:
+        return list(symbol_pairs)
+
+    scores = correlation_scores(matrix) if method == 'correlation' else distance_scores(matrix)
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    np.fill_diagonal(scores, -np.inf)
+
+    keep = np.zeros(scores.shape, dtype=bool)
+    if top_k is not None:
+        k = min(top_k, len(matrix) - 1)
+        if k > 0:
+            neighbours = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            rows = np.repeat(np.arange(len(matrix)), k)
+            keep[rows, neighbours.ravel()] = True
+            keep |= keep.T
+    if threshold is not None:
+        cutoff = threshold if method == 'correlation' else -threshold
+        keep |= scores >= cutoff
+    keep &= np.isfinite(scores)
+
+    # symbol_pairs may be a generator, it is consumed once
+    screened, total = [], 0
+    for symbol_1, symbol_2 in symbol_pairs:
+        total += 1
+        if keep[matrix.row[symbol_1], matrix.row[symbol_2]]:
+            screened.append((symbol_1, symbol_2))
+    logging.info(f'Pair pre-screen ({method}) | kept {len(screened)} of {total} | pruned {total - len(screened)}')
+    return screened
@@ -0,0 +1,290 @@
+'''Stages of the monthly pair selection, shared by the local scheduler (monthly_pair_testing.py)
+and the time sliced Azure function mode (pair_test_chunks.py).
+
+A window is (trainset_start, trainset_end). prepare_window selects the universe and builds the
+close matrix, then the coint, adf and trading_pairs stages each write their table for the window.
+Every stage skips keys already written, so any of them can be rerun or resumed.
+'''
+import logging
+from datetime import datetime, timedelta
+import pandas as pd
+from sqlalchemy import text
+from price_data import load_liquid_closes, load_symbol_closes, liquid_symbols, as_closes
+from price_matrix import PriceMatrix
+from pair_screen import screen_pairs
+from pair_tiles import iter_pairs, pair_count, DEFAULT_BLOCK_SIZE
+from pair_results import load_tested_keys, ResultWriter, DEFAULT_WRITE_BATCH
+from coint_engine import run_coint_tests
+from batched_adf import adf_many
+
+def monthly_windows(start_date, end_date) -> list:
+    # (start, end) of every month from start_date to end_date, rolling on the 25th
+    date_ranges = []
+
+    current_date = start_date
+    while current_date < end_date:
+        next_month = current_date.replace(day=25)  # Set to 25th of current month
+        next_month = next_month.replace(month=next_month.month + 1 if next_month.month < 12 else 1,
+                                        year=next_month.year + 1 if next_month.month == 12 else next_month.year)
+        if next_month > end_date:
+            next_month = end_date
+
+        date_ranges.append((current_date, next_month))
+        current_date = next_month
+    return date_ranges
+
+def latest_window(today) -> tuple:
+    # Most recent complete monthly window, the 25th's candle is fetched on the 26th
+    end = datetime(today.year, today.month, 25)
+    if today.day <= 25:
+        end = end.replace(year=end.year - 1, month=12) if end.month == 1 else end.replace(month=end.month - 1)
+    start = end.replace(year=end.year - 1, month=12) if end.month == 1 else end.replace(month=end.month - 1)
+    return start, end
+
+def trainset_bounds(start_date, end_date):
+    '''TODO don't know why I am subtracting 21 days here I don't think this is right BUT going with it and can adjust after deploying v1'''
+    trainset_start = pd.to_datetime(start_date) - timedelta(days = 20)
+    trainset_end = pd.to_datetime(end_date)
+    return trainset_start, trainset_end
+
+def prepare_window(engine, trainset_start, trainset_end, missing_data_policy: str = 'pairwise', price_store_dir: str = None, symbols: list = None):
+    '''Closes of the window's universe [asset_id, symbol, timestamp, close], its symbols and their date
+    aligned close matrix. Pass symbols to rebuild a window whose universe was already selected, the filters are then skipped.'''
+    if price_store_dir:
+        # The filters run in memory on the close / volume columns of the local mirror, read through read_columns
+        from price_store import load_window
+        trading_asset_ids = pd.read_sql(text('SELECT id FROM asset WHERE trading = 1'), engine)['id'].tolist()
+        prices = load_window(price_store_dir, trainset_start, trainset_end, asset_ids=trading_asset_ids)
+        if symbols is None:
+            symbols = liquid_symbols(prices)
+        training_data = as_closes(prices.loc[prices['symbol'].isin(symbols), ['asset_id', 'symbol', 'open_time', 'close']].rename(columns={'open_time': 'timestamp'}))
+    elif symbols is None:
+        # Day count and value traded filters run in SQL, only the surviving close series are loaded
+        training_data = load_liquid_closes(engine, trainset_start, trainset_end)
+    else:
+        training_data = load_symbol_closes(engine, trainset_start, trainset_end, symbols)
+
+    if symbols is None:
+        symbols = list(training_data['symbol'].cat.categories)
+    logging.info(f'Universe | {len(symbols)} symbols | {len(training_data)} closes')
+
+    # Date aligned close matrix built once for the window, shared with the workers
+    close_matrix = PriceMatrix(training_data, value='close', policy=missing_data_policy, symbols=symbols)
+    logging.info(f'Close matrix | {len(close_matrix)} symbols x {len(close_matrix.dates)} days | policy: {missing_data_policy}')
+
+    return training_data, list(symbols), close_matrix
+
+def candidate_pairs(close_matrix, symbols, prescreen_method: str = None, prescreen_top_k: int = None, prescreen_threshold: float = None, block_size: int = DEFAULT_BLOCK_SIZE):
+    '''Iterable of the (symbol_1, symbol_2) pairs to test. All pairs are generated tile by tile
+    (see pair_tiles.py), nothing is materialised unless the pre-screen keeps a subset.'''
+    symbol_pairs = iter_pairs(symbols, block_size)
+    logging.info(f'Number of possible pair combinations: {pair_count(len(symbols))} | block size: {block_size}')
+
+    # Optionally prune to the closest candidates before the expensive tests
+    if prescreen_method:
+        symbol_pairs = screen_pairs(close_matrix, symbol_pairs, method=prescreen_method, top_k=prescreen_top_k, threshold=prescreen_threshold)
+    return symbol_pairs
+
+def untested_pairs(engine, symbol_pairs, symbol_ids, trainset_start, trainset_end):
+    # Yields (symbol_1, symbol_2, symbol_1_id, symbol_2_id) without a coint result for the window
+    tested_coint = load_tested_keys(engine, 'coint_test_results', trainset_start, trainset_end)
+
+    new, skipped = 0, 0
+    for symbol_1, symbol_2 in symbol_pairs:
+        symbol_1_id = symbol_ids[symbol_1]
+        symbol_2_id = symbol_ids[symbol_2]
+        if (symbol_1_id, symbol_2_id) in tested_coint:
+            skipped += 1
+            continue
+        new += 1
+        yield symbol_1, symbol_2, symbol_1_id, symbol_2_id
+
+    logging.info(f'Cointegration pairs | {new} new | skipped {skipped} tested')
+
+def coint_stage(engine, close_matrix, pairs_to_test, trainset_start, trainset_end, workers: int = None, write_batch_size: int = DEFAULT_WRITE_BATCH) -> int:
+    # Get the current date and time
+    test_date = datetime.now()
+    # If you only want the date part (without the time), you can use date()
+    test_date = test_date.date()
+
+    # pairs_to_test may be a generator, only the pairs of batches in flight are held here
+    pair_lookup = {}
+    def row_pairs():
+        for symbol_1, symbol_2, symbol_1_id, symbol_2_id in pairs_to_test:
+            key = (close_matrix.row[symbol_1], close_matrix.row[symbol_2])
+            pair_lookup[key] = (symbol_1, symbol_2, symbol_1_id, symbol_2_id)
+            yield key
+
+    with ResultWriter(engine, 'coint_test_results', batch_size=write_batch_size) as coint_writer:
+        for batch in run_coint_tests(close_matrix.values, row_pairs(), max_workers=workers):
+            for i, j, coint_t, pvalue, error in batch:
+                symbol_1, symbol_2, symbol_1_id, symbol_2_id = pair_lookup.pop((i, j))
+                pair_name = f'{symbol_1}-{symbol_2}'
+
+                if error is not None:
+                    logging.error(f"Error for pair {pair_name}: {error}")
+                    continue
+
+                coint_writer.add({
+                    'pair': pair_name,
+                    'coint_test_stat': coint_t,
+                    'p_value': pvalue,
+                    'symbol_1_id': symbol_1_id,
+                    'symbol_1': symbol_1,
+                    'symbol_2_id': symbol_2_id,
+                    'symbol_2': symbol_2,
+                    'trainset_start': trainset_start,
+                    'trainset_end': trainset_end,
+                    'test_date': test_date,
+                })
+    logging.info(f'Cointegration results written: {coint_writer.written}')
+    return coint_writer.written
+
+def significant_pairs(engine, trainset_start) -> pd.DataFrame:
+    # Cointegrated pairs of the window, the input of the ADF stage
+    test_results_query = text('''
+        SELECT pair, coint_test_stat, p_value, symbol_1, symbol_2, trainset_start, trainset_end, test_date
+        FROM coint_test_results
+        WHERE p_value < 0.05 AND trainset_start = :trainset_start
+        ORDER BY p_value ASC;
+    ''')
+
+    return pd.read_sql(test_results_query, engine, params={'trainset_start': trainset_start})
+
+def adf_stage(engine, close_matrix, symbol_ids, trainset_start, trainset_end, write_batch_size: int = DEFAULT_WRITE_BATCH, symbol_pairs: list = None) -> int:
+    # symbol_pairs restricts the stage to a shard of the significant pairs
+    best_results = significant_pairs(engine, trainset_start)
+    if symbol_pairs is not None:
+        shard = set(map(tuple, symbol_pairs))
+        best_results = best_results[[pair in shard for pair in zip(best_results['symbol_1'], best_results['symbol_2'])]]
+
+    # Get the current date and time
+    test_date = datetime.now()
+    # If you only want the date part (without the time), you can use date()
+    test_date = test_date.date()
+
+    tested_adf = load_tested_keys(engine, 'adf_test_results', trainset_start, trainset_end)
+
+    # Build the hedged spread of every untested pair, then ADF test them in one batched call
+    adf_pairs = []
+    spreads = []
+    for index, row in best_results.iterrows():
+        symbol_1 = row['symbol_1']
+        symbol_2 = row['symbol_2']
+        pair_name = f'{symbol_1}-{symbol_2}'
+
+        symbol_1_id = symbol_ids[symbol_1]
+        symbol_2_id = symbol_ids[symbol_2]
+
+        if (symbol_1_id, symbol_2_id) not in tested_adf:
+            try:
+                # Both legs come from the window's close matrix, aligned on the days both traded
+                if symbol_1 in close_matrix.row and symbol_2 in close_matrix.row:
+                    dates, closes_1, closes_2 = close_matrix.pair(symbol_1, symbol_2)
+                else:
+                    dates = []
+
+                # Fall back to the db when the pair is not in memory (e.g. tested by an earlier run with other filters)
+                if len(dates) == 0:
+                    pair_data_query = text(f'''
+                        SELECT
+                            ap_symbol_1.open_time AS date,
+                            CAST(ap_symbol_1.close AS DOUBLE PRECISION) AS close_{symbol_1},
+                            CAST(ap_symbol_2.close AS DOUBLE PRECISION) AS close_{symbol_2}
+                        FROM
+                            asset_price AS ap_symbol_1
+                        INNER JOIN
+                            asset AS a_symbol_1 ON ap_symbol_1.asset_id = a_symbol_1.id
+                        INNER JOIN
+                            asset_price AS ap_symbol_2
+                            ON ap_symbol_1.open_time = ap_symbol_2.open_time
+                            AND ap_symbol_1.asset_id <> ap_symbol_2.asset_id
+                        INNER JOIN
+                            asset AS a_symbol_2 ON ap_symbol_2.asset_id = a_symbol_2.id
+                        WHERE
+                            a_symbol_1.symbol = :symbol_1
+                                AND a_symbol_2.symbol = :symbol_2
+                                AND ap_symbol_1.open_time BETWEEN :trainset_start AND :trainset_end
+                        ORDER BY
+                            ap_symbol_1.open_time;
+                    ''')
+
+                    logging.info(f'Pair {pair_name} not in the window matrix, loading from db')
+                    pair_data = pd.read_sql_query(pair_data_query, engine, params={'symbol_1': symbol_1, 'symbol_2': symbol_2, 'trainset_start': trainset_start, 'trainset_end': trainset_end})
+                    closes_1 = pair_data[f'close_{(symbol_1).lower()}'].to_numpy(dtype='float64')
+                    closes_2 = pair_data[f'close_{(symbol_2).lower()}'].to_numpy(dtype='float64')
+
+                # Hedge ratio of OLS without a constant, as the statsmodels fit did
+                hedge_ratio = closes_1 @ closes_2 / (closes_2 @ closes_2)
+                spreads.append(closes_1 - hedge_ratio * closes_2)
+                adf_pairs.append((pair_name, symbol_1, symbol_2, symbol_1_id, symbol_2_id))
+
+            except Exception as e:
+                logging.error(f"An error occurred for pair {symbol_1} - {symbol_2}: {str(e)}. No pair_data in db.")
+                continue
+
+    logging.info(f'ADF testing {len(adf_pairs)} new pairs | skipped {len(best_results) - len(adf_pairs)}')
+
+    # Perform ADF test on the spreads, same results as adfuller(spread) per pair
+    adf_results = adf_many(spreads, regression='c')
+
+    with ResultWriter(engine, 'adf_test_results', batch_size=write_batch_size) as adf_writer:
+        for (pair_name, symbol_1, symbol_2, symbol_1_id, symbol_2_id), (adf_statistic, pvalue, error) in zip(adf_pairs, adf_results):
+            if error is not None:
+                logging.error(f"An error occurred for pair {symbol_1} - {symbol_2}: {error}")
+                continue
+
+            # Determine stationarity based on p-value
+            stationary = bool(pvalue <= 0.05)
+
+            adf_writer.add({
+                'pair': pair_name,
+                'adf_test_stat': adf_statistic,
+                'p_value': pvalue,
+                'stationary': stationary,
+                'symbol_1_id': symbol_1_id,
+                'symbol_1': symbol_1,
+                'symbol_2_id': symbol_2_id,
+                'symbol_2': symbol_2,
+                'test_date': test_date,
+                'trainset_start': trainset_start,
+                'trainset_end': trainset_end,
+            })
+    return adf_writer.written
+
+def trading_pairs_stage(engine, symbol_ids, trainset_start, trainset_end, write_batch_size: int = DEFAULT_WRITE_BATCH) -> int:
+    # ----------------------------------------
+    # Populate trading pairs db with top pairs
+    # ----------------------------------------
+    top_pairs_query = text('''
+        SELECT *
+        FROM adf_test_results
+        WHERE stationary = TRUE AND trainset_end = :trainset_end
+        ORDER BY adf_test_stat
+        LIMIT 25;
+    ''')
+
+    top_pairs = pd.read_sql_query(top_pairs_query, engine, params={'trainset_end': trainset_end})
+
+    # Get the current date and time
+    test_date = datetime.now().date()
+
+    tested_trading_pairs = load_tested_keys(engine, 'trading_pairs', trainset_start, trainset_end)
+
+    with ResultWriter(engine, 'trading_pairs', batch_size=write_batch_size) as trading_pairs_writer:
+        for i, row in top_pairs.iterrows():
+
+            symbol_1 = row['symbol_1']
+            symbol_2 = row['symbol_2']
+            symbol_1_id = symbol_ids[symbol_1]
+            symbol_2_id = symbol_ids[symbol_2]
+
+            if (symbol_1_id, symbol_2_id) not in tested_trading_pairs:
+                trading_pairs_writer.add({
+                    'symbol_1_id': symbol_1_id,
+                    'symbol_2_id': symbol_2_id,
+                    'trainset_start': trainset_start,
+                    'trainset_end': trainset_end,
+                    'test_date': test_date
+                })
+    return trading_pairs_writer.written
@@ -0,0 +1,70 @@
+'''Time sliced pair testing for the Azure function.
+
+A monthly window does not fit in the 10 minute functionTimeout, so the pair testing timer in
+function_app.py calls run_time_slice every few minutes. The first slice of a window plans it once
+(universe and coint pair shards), then every slice claims shards and tests them until its time
+budget is spent, moving the window on to the ADF shards and trading_pairs as each stage finishes.
+The work lives in the Postgres tables of pair_workers.py (pair_test_windows / pair_test_shards), so
+it survives instance recycling, and a slice killed mid shard only repeats that shard once its lease
+expires; the writes are idempotent.
+
+A window is planned only once data_fetch has stored the candle of its last day. Every shard of the
+window is tested on the same closes as the universe was selected from.
+'''
+from datetime import datetime
+import logging
+import time
+import pandas as pd
+from pair_stages import latest_window, trainset_bounds
+from pair_workers import load_window, plan_window, advance_window, claim_shard, ShardRunner, DEFAULT_SHARD_SIZE
+from watermarks import load_db_range
+from checkpoints import window_key
+
+# Stop claiming shards after this long, leaves headroom under functionTimeout 00:10:00
+DEFAULT_SLICE_SECONDS = 480
+
+# A shard of a slice killed by functionTimeout is claimable again once this has passed
+SLICE_LEASE_SECONDS = 600
+
+def data_complete(engine, trainset_end) -> bool:
+    # True once the candle of the window's last day is stored. data_fetch merges every asset's candles
+    # in one transaction, so the newest close of any asset stands for the whole universe.
+    with engine.connect() as connection:
+        _, last_close = load_db_range(connection)
+    trainset_end = pd.Timestamp(trainset_end)
+    if trainset_end.tzinfo is None:
+        trainset_end = trainset_end.tz_localize('UTC')
+    return last_close is not None and pd.Timestamp(last_close) >= trainset_end
+
+def run_time_slice(engine, today=None, slice_seconds: float = DEFAULT_SLICE_SECONDS, shard_size: int = DEFAULT_SHARD_SIZE, missing_data_policy: str = 'pairwise', prescreen: dict = None) -> dict:
+    '''Work on the latest monthly window for at most slice_seconds, returns a progress summary.
+    A shard is only started while the slowest shard seen so far still fits in the remaining budget.'''
+    started = time.monotonic()
+    start, end = latest_window(today or datetime.now().date())
+    trainset_start, trainset_end = trainset_bounds(start, end)
+    key = window_key(trainset_start, trainset_end)
+
+    if load_window(engine, trainset_start, trainset_end) is None:
+        if not data_complete(engine, trainset_end):
+            logging.info(f'Window {key} waiting for the {trainset_end:%Y-%m-%d} candles')
+            return {'window': key, 'state': 'waiting for data', 'units_done': 0}
+        plan_window(engine, trainset_start, trainset_end, shard_size, missing_data_policy, prescreen)
+
+    runner = ShardRunner(engine, missing_data_policy=missing_data_policy)
+    units_done = 0
+    slowest = 0.0
+    state = advance_window(engine, trainset_start, trainset_end, lease_seconds=SLICE_LEASE_SECONDS)
+    while state in ('coint', 'adf') and time.monotonic() - started + slowest < slice_seconds:
+        shard = claim_shard(engine, runner.worker, SLICE_LEASE_SECONDS, trainset_start=trainset_start, trainset_end=trainset_end)
+        if shard is None:
+            # Either the stage just finished, or its open shards are held by another slice
+            previous, state = state, advance_window(engine, trainset_start, trainset_end, lease_seconds=SLICE_LEASE_SECONDS)
+            if state == previous:
+                break
+            continue
+        unit_started = time.monotonic()
+        units_done += runner.run(shard)
+        slowest = max(slowest, time.monotonic() - unit_started)
+
+    logging.info(f'Pair test slice | window {key} | {state} | {units_done} shards done | {time.monotonic() - started:.1f}s')
+    return {'window': key, 'state': state, 'units_done': units_done}
@@ -0,0 +1,35 @@
+'''Blockwise enumeration of the symbol pairs of a window.
+
+The universe is cut into blocks of block_size symbols and pairs are produced one block x block tile
+at a time (upper triangle only, i < j), so nothing proportional to the number of pairs is ever
+materialised. Tile order also keeps each batch of the cointegration engine to a few blocks of
+symbols: batched_coint.hedge_residuals centres those rows once and takes the hedge regressions of
+all their pairs from one Gram matrix. A smaller block size means fewer distinct symbols per batch.
+'''
+from itertools import chain
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 64
+
+def pair_count(count: int) -> int:
+    return count * (count - 1) // 2
+
+def tile_rows(count: int, block_size: int = DEFAULT_BLOCK_SIZE):
+    '''Yield (rows_1, rows_2) index arrays of the i < j pairs of each tile, tile by tile.'''
+    if block_size < 1:
+        raise ValueError('block_size must be at least 1')
+    for start_1 in range(0, count, block_size):
+        block_1 = np.arange(start_1, min(start_1 + block_size, count))
+        for start_2 in range(start_1, count, block_size):
+            block_2 = np.arange(start_2, min(start_2 + block_size, count))
+            rows_1, rows_2 = np.meshgrid(block_1, block_2, indexing='ij')
+            upper = rows_1 < rows_2
+            yield rows_1[upper], rows_2[upper]
+
+def iter_pairs(symbols, block_size: int = DEFAULT_BLOCK_SIZE):
+    '''Every (symbol_1, symbol_2) of combinations(symbols, 2), generated tile by tile.'''
+    symbols = list(symbols)
+    return chain.from_iterable(
+        zip([symbols[i] for i in rows_1], [symbols[j] for j in rows_2])
+        for rows_1, rows_2 in tile_rows(len(symbols), block_size)
+    )
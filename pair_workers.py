@@ -0,0 +1,342 @@
+'''Distributed coint/ADF testing over a Postgres work table.
+
+The coordinator selects each window's universe once, stores it in pair_test_windows and queues pair
+shards in pair_test_shards. Any number of workers, on any machine that reaches the database, claim
+shards with SELECT ... FOR UPDATE SKIP LOCKED, test them and mark them done. Once every coint shard of
+a window is done the significant pairs are queued as ADF shards, and after those the window's
+trading_pairs are written (advance_window).
+
+Completion is idempotent through the primary keys of coint_test_results / adf_test_results: a shard
+whose worker died is reclaimed after the lease expires, a failed shard is retried up to
+max_attempts, already written pairs are skipped and any overlap is absorbed by ON CONFLICT DO
+NOTHING. A window with a shard that exhausted its attempts is reported as failed and never gets
+trading_pairs written from partial results.
+
+    python pair_workers.py coordinator --local-workers 4   # coordinator plus 4 local worker processes
+    python pair_workers.py worker                          # extra worker, e.g. on another node
+'''
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from pair_results import load_symbol_ids
+from pair_stages import monthly_windows, trainset_bounds, prepare_window, candidate_pairs, untested_pairs, significant_pairs, coint_stage, adf_stage, trading_pairs_stage
+
+# Pairs per coint shard, ADF shards are smaller since only significant pairs reach them
+DEFAULT_SHARD_SIZE = 2000
+DEFAULT_ADF_SHARD_SIZE = 500
+
+# A running shard not completed within the lease is handed to another worker
+DEFAULT_LEASE_SECONDS = 900
+
+# Claims per shard, counting the first one, before its window is reported as failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+# The coordinator gives up when no shard is claimed or completed for this long
+DEFAULT_STALL_SECONDS = 2 * DEFAULT_LEASE_SECONDS
+
+DEFAULT_POLL_SECONDS = 5
+
+insert_window_query = text('''
+    INSERT INTO pair_test_windows (trainset_start, trainset_end, symbols)
+    VALUES (:trainset_start, :trainset_end, CAST(:symbols AS JSONB))
+    ON CONFLICT (trainset_start, trainset_end) DO NOTHING
+''')
+
+window_query = text('''
+    SELECT symbols, adf_queued_at, completed_at FROM pair_test_windows
+    WHERE trainset_start = :trainset_start AND trainset_end = :trainset_end
+''')
+
+# Only the first caller queues the ADF shards, a concurrent one finds adf_queued_at already set
+mark_adf_queued_query = text('''
+    UPDATE pair_test_windows SET adf_queued_at = now()
+    WHERE trainset_start = :trainset_start AND trainset_end = :trainset_end AND adf_queued_at IS NULL
+''')
+
+mark_complete_query = text('''
+    UPDATE pair_test_windows SET completed_at = now()
+    WHERE trainset_start = :trainset_start AND trainset_end = :trainset_end
+''')
+
+insert_shard_query = text('''
+    INSERT INTO pair_test_shards (trainset_start, trainset_end, stage, shard_no, pairs)
+    VALUES (:trainset_start, :trainset_end, :stage, :shard_no, CAST(:pairs AS JSONB))
+    ON CONFLICT (trainset_start, trainset_end, stage, shard_no) DO NOTHING
+''')
+
+# Lowest claimable shard: pending, failed with attempts left, or running past its lease with attempts
+# left. SKIP LOCKED lets concurrent workers pass over rows another worker is claiming instead of
+# queueing behind it. A NULL window claims from any window.
+claim_shard_query = text('''
+    UPDATE pair_test_shards
+    SET status = 'running', claimed_by = :worker, claimed_at = now(), attempts = attempts + 1, error = NULL
+    WHERE id = (
+        SELECT id FROM pair_test_shards
+        WHERE (status = 'pending'
+                OR (status = 'failed' AND attempts < :max_attempts)
+                OR (status = 'running' AND attempts < :max_attempts AND claimed_at < now() - make_interval(secs => :lease_seconds)))
+            AND (CAST(:trainset_start AS TIMESTAMPTZ) IS NULL
+                OR (trainset_start = :trainset_start AND trainset_end = :trainset_end))
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, trainset_start, trainset_end, stage, pairs
+''')
+
+complete_shard_query = text('''
+    UPDATE pair_test_shards
+    SET status = :status, completed_at = now(), error = :error
+    WHERE id = :id
+''')
+
+# done, open (will still be worked on) or exhausted (failed, or its lease expired, with no attempts left)
+stage_progress_query = text('''
+    SELECT
+        CASE
+            WHEN status = 'done' THEN 'done'
+            WHEN attempts >= :max_attempts
+                AND (status = 'failed' OR (status = 'running' AND claimed_at < now() - make_interval(secs => :lease_seconds)))
+                THEN 'exhausted'
+            ELSE 'open'
+        END AS state,
+        COUNT(*) AS shards
+    FROM pair_test_shards
+    WHERE trainset_start = :trainset_start AND trainset_end = :trainset_end AND stage = :stage
+    GROUP BY 1
+''')
+
+# Changes whenever any worker claims or completes a shard of the windows
+shard_activity_query = text('''
+    SELECT COUNT(*) FILTER (WHERE status = 'done'), COALESCE(SUM(attempts), 0)
+    FROM pair_test_shards
+    WHERE trainset_start >= :trainset_start AND trainset_end <= :trainset_end
+''')
+
+def enqueue_shards(connection, trainset_start, trainset_end, stage: str, symbol_pairs: list, shard_size: int) -> int:
+    shards = [{
+        'trainset_start': trainset_start,
+        'trainset_end': trainset_end,
+        'stage': stage,
+        'shard_no': shard_no,
+        'pairs': json.dumps(symbol_pairs[k:k + shard_size]),
+    } for shard_no, k in enumerate(range(0, len(symbol_pairs), shard_size))]
+    if shards:
+        connection.execute(insert_shard_query, shards)
+    return len(shards)
+
+def load_window(engine, trainset_start, trainset_end):
+    # (symbols, adf_queued_at, completed_at) of a planned window, None when it was never planned
+    with engine.connect() as connection:
+        return connection.execute(window_query, {'trainset_start': trainset_start, 'trainset_end': trainset_end}).fetchone()
+
+def plan_window(engine, trainset_start, trainset_end, shard_size: int = DEFAULT_SHARD_SIZE, missing_data_policy: str = 'pairwise', prescreen: dict = None) -> int:
+    # Universe and coint shards of one window. The pairs are cut before anything is written and the window
+    # row goes in with its shards in one transaction, so a planner killed part way leaves nothing behind.
+    # A window planned before keeps its universe, a second call adds nothing.
+    window = load_window(engine, trainset_start, trainset_end)
+    stored = window[0] if window is not None else None
+    training_data, symbols, close_matrix = prepare_window(engine, trainset_start, trainset_end, missing_data_policy=missing_data_policy, symbols=stored)
+    symbol_pairs = [list(pair) for pair in candidate_pairs(close_matrix, symbols, **(prescreen or {}))]
+    with engine.begin() as connection:
+        connection.execute(insert_window_query, {'trainset_start': trainset_start, 'trainset_end': trainset_end, 'symbols': json.dumps(symbols)})
+        stored = connection.execute(window_query, {'trainset_start': trainset_start, 'trainset_end': trainset_end}).fetchone()[0]
+        if sorted(stored) != sorted(symbols):
+            # A concurrent planner committed the window first, together with its own shards
+            logging.info(f'Window {trainset_start:%Y-%m-%d} --> {trainset_end:%Y-%m-%d} was planned by another process')
+            return 0
+        shards = enqueue_shards(connection, trainset_start, trainset_end, 'coint', symbol_pairs, shard_size)
+    logging.info(f'Planned window {trainset_start:%Y-%m-%d} --> {trainset_end:%Y-%m-%d} | {len(symbols)} symbols | {len(symbol_pairs)} pairs | {shards} coint shards')
+    return shards
+
+def stage_progress(engine, trainset_start, trainset_end, stage: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> dict:
+    params = {'trainset_start': trainset_start, 'trainset_end': trainset_end, 'stage': stage, 'max_attempts': max_attempts, 'lease_seconds': lease_seconds}
+    with engine.connect() as connection:
+        rows = connection.execute(stage_progress_query, params).fetchall()
+    return {state: shards for state, shards in rows}
+
+def advance_window(engine, trainset_start, trainset_end, adf_shard_size: int = DEFAULT_ADF_SHARD_SIZE, max_attempts: int = DEFAULT_MAX_ATTEMPTS, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> str:
+    '''Move a planned window on once its current stage is finished and return its state:
+    coint / adf while that stage still has open shards, failed when a shard exhausted its attempts,
+    complete once trading_pairs is written. Safe to call from any number of processes.'''
+    window = load_window(engine, trainset_start, trainset_end)
+    if window is None:
+        raise ValueError(f'window {trainset_start:%Y-%m-%d} --> {trainset_end:%Y-%m-%d} was never planned')
+    symbols, adf_queued_at, completed_at = window
+    if completed_at is not None:
+        return 'complete'
+
+    progress = stage_progress(engine, trainset_start, trainset_end, 'coint', max_attempts, lease_seconds)
+    if progress.get('open'):
+        return 'coint'
+    if progress.get('exhausted'):
+        return 'failed'
+
+    if adf_queued_at is None:
+        best_results = significant_pairs(engine, trainset_start)
+        adf_pairs = [[symbol_1, symbol_2] for symbol_1, symbol_2 in zip(best_results['symbol_1'], best_results['symbol_2'])]
+        with engine.begin() as connection:
+            if connection.execute(mark_adf_queued_query, {'trainset_start': trainset_start, 'trainset_end': trainset_end}).rowcount:
+                shards = enqueue_shards(connection, trainset_start, trainset_end, 'adf', adf_pairs, adf_shard_size)
+                logging.info(f'Coint shards {progress} | queued {shards} adf shards | {trainset_start:%Y-%m-%d} --> {trainset_end:%Y-%m-%d}')
+
+    progress = stage_progress(engine, trainset_start, trainset_end, 'adf', max_attempts, lease_seconds)
+    if progress.get('open'):
+        return 'adf'
+    if progress.get('exhausted'):
+        return 'failed'
+
+    rows = trading_pairs_stage(engine, load_symbol_ids(engine), trainset_start, trainset_end)
+    with engine.begin() as connection:
+        connection.execute(mark_complete_query, {'trainset_start': trainset_start, 'trainset_end': trainset_end})
+    logging.info(f'ADF shards {progress} | {rows} trading pairs | {trainset_start:%Y-%m-%d} --> {trainset_end:%Y-%m-%d}')
+    return 'complete'
+
+def claim_shard(engine, worker: str, lease_seconds: int = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS, trainset_start=None, trainset_end=None):
+    params = {'worker': worker, 'lease_seconds': lease_seconds, 'max_attempts': max_attempts, 'trainset_start': trainset_start, 'trainset_end': trainset_end}
+    with engine.begin() as connection:
+        return connection.execute(claim_shard_query, params).fetchone()
+
+def complete_shard(engine, shard_id: int, error: str = None):
+    with engine.begin() as connection:
+        connection.execute(complete_shard_query, {'id': shard_id, 'status': 'failed' if error else 'done', 'error': error})
+
+class ShardRunner:
+    # Tests claimed shards, the close matrix of the last window is kept for the next shard of it
+    def __init__(self, engine, worker: str = None, missing_data_policy: str = 'pairwise'):
+        self.engine = engine
+        self.worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        self.missing_data_policy = missing_data_policy
+        self.window = None
+        self.close_matrix = None
+
+    def run(self, shard) -> bool:
+        # True when the shard was completed, a failure is recorded on the shard for a later retry
+        shard_id, trainset_start, trainset_end, stage, pairs = shard
+        try:
+            if self.window != (trainset_start, trainset_end):
+                symbols = load_window(self.engine, trainset_start, trainset_end)[0]
+                training_data, symbols, self.close_matrix = prepare_window(self.engine, trainset_start, trainset_end, missing_data_policy=self.missing_data_policy, symbols=symbols)
+                self.window = (trainset_start, trainset_end)
+
+            symbol_ids = load_symbol_ids(self.engine)
+            symbol_pairs = [tuple(pair) for pair in pairs]
+            if stage == 'coint':
+                pairs_to_test = untested_pairs(self.engine, symbol_pairs, symbol_ids, trainset_start, trainset_end)
+                rows = coint_stage(self.engine, self.close_matrix, pairs_to_test, trainset_start, trainset_end, workers=1)
+            else:
+                rows = adf_stage(self.engine, self.close_matrix, symbol_ids, trainset_start, trainset_end, symbol_pairs=symbol_pairs)
+            complete_shard(self.engine, shard_id)
+            logging.info(f'Worker {self.worker} | {stage} shard {shard_id} done | {rows} rows')
+            return True
+        except Exception as e:
+            logging.error(f'Worker {self.worker} | {stage} shard {shard_id} failed: {e}')
+            complete_shard(self.engine, shard_id, error=str(e))
+            return False
+
+def run_worker(engine, worker: str = None, stop=None, idle_exit_seconds: float = None, lease_seconds: int = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS, poll_seconds: float = DEFAULT_POLL_SECONDS, missing_data_policy: str = 'pairwise') -> int:
+    '''Claim and test shards until stop (a multiprocessing Event) is set with nothing left to claim,
+    or until none has been available for idle_exit_seconds. Runs forever with neither.'''
+    runner = ShardRunner(engine, worker, missing_data_policy)
+    shards_done = 0
+    idle_since = time.monotonic()
+
+    while True:
+        shard = claim_shard(engine, runner.worker, lease_seconds, max_attempts)
+        if shard is None:
+            if stop is not None and stop.is_set():
+                break
+            if idle_exit_seconds is not None and time.monotonic() - idle_since > idle_exit_seconds:
+                break
+            time.sleep(poll_seconds)
+            continue
+        shards_done += runner.run(shard)
+        idle_since = time.monotonic()
+    return shards_done
+
+def shard_activity(engine, windows: list) -> tuple:
+    params = {'trainset_start': min(start for start, end in windows), 'trainset_end': max(end for start, end in windows)}
+    with engine.connect() as connection:
+        return tuple(connection.execute(shard_activity_query, params).one())
+
+def run_coordinator(engine, date_ranges: list, shard_size: int = DEFAULT_SHARD_SIZE, adf_shard_size: int = DEFAULT_ADF_SHARD_SIZE, poll_seconds: float = DEFAULT_POLL_SECONDS, stall_seconds: float = DEFAULT_STALL_SECONDS, workers: list = None, missing_data_policy: str = 'pairwise', prescreen: dict = None) -> list:
+    '''Queue every window's coint shards up front so workers are never short of work, then advance the
+    windows until each is complete or failed. Returns the failed windows.
+    Raises TimeoutError when no shard is claimed or completed for stall_seconds, and RuntimeError when
+    every local worker process (workers) has died while shards are still open.'''
+    windows = [trainset_bounds(start, end) for start, end in date_ranges]
+    for trainset_start, trainset_end in windows:
+        plan_window(engine, trainset_start, trainset_end, shard_size, missing_data_policy, prescreen)
+
+    remaining, failed = list(windows), []
+    activity, active_at = None, time.monotonic()
+    while remaining:
+        for trainset_start, trainset_end in list(remaining):
+            state = advance_window(engine, trainset_start, trainset_end, adf_shard_size)
+            if state == 'complete':
+                remaining.remove((trainset_start, trainset_end))
+            elif state == 'failed':
+                logging.error(f'Window {trainset_start:%Y-%m-%d} --> {trainset_end:%Y-%m-%d} has shards that failed {DEFAULT_MAX_ATTEMPTS} times, trading_pairs not written')
+                remaining.remove((trainset_start, trainset_end))
+                failed.append((trainset_start, trainset_end))
+        if not remaining:
+            break
+
+        current = shard_activity(engine, remaining)
+        if current != activity:
+            activity, active_at = current, time.monotonic()
+        elif time.monotonic() - active_at > stall_seconds:
+            raise TimeoutError(f'No shard claimed or completed for {stall_seconds:.0f}s, {len(remaining)} windows unfinished')
+        if workers and not any(process.is_alive() for process in workers):
+            raise RuntimeError(f'All local workers exited, {len(remaining)} windows unfinished')
+        time.sleep(poll_seconds)
+    return failed
+
+def _local_worker(database_url: str, stop):
+    # Each process opens its own pool, connections are never shared across processes
+    logging.basicConfig(level=logging.INFO)
+    run_worker(create_engine(database_url), stop=stop)
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Distributed coint/ADF pair testing')
+    parser.add_argument('role', choices=['coordinator', 'worker'])
+    parser.add_argument('--start', default=os.getenv('PAIR_TEST_START', '2022-01-25'), help='first window start, YYYY-MM-DD')
+    parser.add_argument('--end', default=os.getenv('PAIR_TEST_END', '2023-01-25'), help='last window end, YYYY-MM-DD')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument('--local-workers', type=int, default=0, help='worker processes started next to the coordinator')
+    parser.add_argument('--stall-timeout', type=float, default=DEFAULT_STALL_SECONDS, help='coordinator gives up after this many seconds without shard activity')
+    parser.add_argument('--idle-exit', type=float, default=None, help='workers stop after this many idle seconds')
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL') or f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME_FUT')}"
+    if args.role == 'worker':
+        run_worker(create_engine(database_url), idle_exit_seconds=args.idle_exit)
+        return
+
+    date_ranges = monthly_windows(datetime.strptime(args.start, '%Y-%m-%d'), datetime.strptime(args.end, '%Y-%m-%d'))
+    # Local workers poll until the coordinator is finished, however long planning or a stage gap takes
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    workers = [context.Process(target=_local_worker, args=(database_url, stop)) for _ in range(args.local_workers)]
+    for process in workers:
+        process.start()
+    try:
+        failed = run_coordinator(create_engine(database_url), date_ranges, shard_size=args.shard_size, stall_seconds=args.stall_timeout, workers=workers)
+    finally:
+        stop.set()
+        for process in workers:
+            process.join()
+    if failed:
+        raise SystemExit(f'{len(failed)} windows failed: {failed}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''Float64 load layer for price research.
+
+asset_price keeps NUMERIC columns so order sizing can stay exact, but read back through pandas
+those become object columns of decimal.Decimal and every downstream op runs on boxed Python
+objects. Everything here casts to DOUBLE PRECISION in SQL so frames arrive as float64.
+
+The monthly universe filters (minimum days of data, value traded above the 75th percentile) run
+in SQL as well, so only the close series of the surviving symbols leave the database.
+'''
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+# Universe filters of the monthly pair selection
+MIN_DAYS = 30
+VALUE_QUANTILE = 0.75
+
+# value_traded = close * volume is min-max scaled over every row of the symbols with enough days
+# (MinMaxScaler over the whole frame), summed per symbol, and symbols strictly above the quantile
+# of those sums are kept. percentile_cont interpolates linearly like pandas' quantile.
+liquid_closes_query = text('''
+    WITH window_prices AS (
+        SELECT ap.asset_id, CAST(ap.close AS DOUBLE PRECISION) * CAST(ap.volume AS DOUBLE PRECISION) AS value_traded
+        FROM asset_price AS ap
+        INNER JOIN asset AS a
+        ON ap.asset_id = a.id
+        WHERE ap.open_time >= :dataset_start AND ap.open_time <= :dataset_end AND a.trading = 1
+    ),
+    eligible AS (
+        SELECT asset_id, SUM(value_traded) AS value_traded, COUNT(value_traded) AS valued_days
+        FROM window_prices
+        GROUP BY asset_id
+        HAVING COUNT(*) >= :min_days
+    ),
+    bounds AS (
+        SELECT MIN(wp.value_traded) AS low, NULLIF(MAX(wp.value_traded) - MIN(wp.value_traded), 0) AS span
+        FROM window_prices AS wp
+        INNER JOIN eligible AS e
+        ON wp.asset_id = e.asset_id
+    ),
+    -- sum((v - low) / span) = (sum(v) - n * low) / span, a constant value_traded scales to 0
+    symbol_value AS (
+        SELECT e.asset_id, COALESCE((e.value_traded - e.valued_days * b.low) / b.span, 0) AS norm_value_traded
+        FROM eligible AS e
+        CROSS JOIN bounds AS b
+    ),
+    liquid AS (
+        SELECT sv.asset_id
+        FROM symbol_value AS sv
+        WHERE sv.norm_value_traded > (
+            SELECT percentile_cont(:quantile) WITHIN GROUP (ORDER BY norm_value_traded) FROM symbol_value
+        )
+    )
+    SELECT ap.asset_id, a.symbol, ap.open_time AS timestamp, CAST(ap.close AS DOUBLE PRECISION) AS close
+    FROM asset_price AS ap
+    INNER JOIN asset AS a
+    ON ap.asset_id = a.id
+    WHERE ap.open_time >= :dataset_start AND ap.open_time <= :dataset_end
+        AND ap.asset_id IN (SELECT asset_id FROM liquid)
+''')
+
+symbol_closes_query = text('''
+    SELECT ap.asset_id, a.symbol, ap.open_time AS timestamp, CAST(ap.close AS DOUBLE PRECISION) AS close
+    FROM asset_price AS ap
+    INNER JOIN asset AS a
+    ON ap.asset_id = a.id
+    WHERE ap.open_time >= :dataset_start AND ap.open_time <= :dataset_end AND a.symbol IN :symbols
+''').bindparams(bindparam('symbols', expanding=True))
+
+asset_closes_query = text('''
+    SELECT ap.open_time AS date, a.symbol, CAST(ap.close AS DOUBLE PRECISION) AS close
+    FROM asset_price AS ap
+    INNER JOIN asset AS a
+    ON ap.asset_id = a.id
+    WHERE ap.asset_id IN :asset_ids AND ap.open_time BETWEEN :dataset_start AND :dataset_end
+''').bindparams(bindparam('asset_ids', expanding=True))
+
+def load_close_matrix(engine, asset_ids: list, dataset_start, dataset_end) -> pd.DataFrame:
+    # date x symbol float64 closes of the given assets in one query, NaN where a symbol has no candle
+    frame = pd.read_sql(asset_closes_query, engine, params={'asset_ids': [int(asset_id) for asset_id in asset_ids], 'dataset_start': dataset_start, 'dataset_end': dataset_end})
+    frame = as_float64(frame, ['close'])
+    return frame.pivot(index='date', columns='symbol', values='close').sort_index()
+
+def load_liquid_closes(engine, dataset_start, dataset_end, min_days: int = MIN_DAYS, quantile: float = VALUE_QUANTILE) -> pd.DataFrame:
+    # [asset_id, symbol, timestamp, close] of the symbols passing the universe filters, symbol as category
+    frame = pd.read_sql(liquid_closes_query, engine, params={'dataset_start': dataset_start, 'dataset_end': dataset_end, 'min_days': min_days, 'quantile': quantile})
+    return as_closes(frame)
+
+def load_symbol_closes(engine, dataset_start, dataset_end, symbols: list) -> pd.DataFrame:
+    # Same frame for a universe selected earlier
+    frame = pd.read_sql(symbol_closes_query, engine, params={'dataset_start': dataset_start, 'dataset_end': dataset_end, 'symbols': list(symbols)})
+    return as_closes(frame)
+
+def as_closes(frame: pd.DataFrame) -> pd.DataFrame:
+    frame['symbol'] = frame['symbol'].astype('category').cat.remove_unused_categories()
+    return as_float64(frame, ['close'])
+
+def liquid_symbols(frame: pd.DataFrame, min_days: int = MIN_DAYS, quantile: float = VALUE_QUANTILE) -> list:
+    '''The universe filters of liquid_closes_query for an OHLCV frame already in memory (the local price
+    store). Works on two float64 arrays and a per-symbol groupby, the frame itself is not copied.'''
+    days = frame['symbol'].value_counts()
+    eligible = frame['symbol'].isin(days.index[days >= min_days]).to_numpy()
+    prices = float_arrays(frame, ('close', 'volume'))
+    value_traded = (prices['close'] * prices['volume'])[eligible]
+    if len(value_traded) == 0:
+        return []
+    span = np.nanmax(value_traded) - np.nanmin(value_traded)
+    scaled = (value_traded - np.nanmin(value_traded)) / span if span else np.zeros_like(value_traded)
+    symbol_value = pd.Series(scaled).groupby(frame['symbol'].to_numpy()[eligible], observed=True).sum()
+    return symbol_value.index[symbol_value > symbol_value.quantile(quantile)].tolist()
+
+def as_float64(frame: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    # Safety net for frames that still carry Decimal objects (older queries, cached frames)
+    for column in columns or [c for c in PRICE_FIELDS if c in frame.columns]:
+        if frame[column].dtype != np.float64:
+            frame[column] = frame[column].astype(np.float64)
+    return frame
+
+def float_arrays(frame: pd.DataFrame, columns: list = ('close', 'volume')) -> dict:
+    # column -> contiguous float64 NumPy array
+    return {column: np.ascontiguousarray(frame[column].to_numpy(dtype=np.float64)) for column in columns}
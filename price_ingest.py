@@ -0,0 +1,112 @@
+from io import StringIO
+import logging
+import pandas as pd
+from watermarks import refresh_watermarks_sql, watermark_table_sql
+
+PRICE_COLUMNS = ['asset_id', 'open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time']
+
+create_staging_query = '''
+    CREATE TEMP TABLE asset_price_staging (LIKE asset_price INCLUDING DEFAULTS) ON COMMIT DROP;
+'''
+
+copy_staging_query = f'''
+    COPY asset_price_staging ({', '.join(PRICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)
+'''
+
+# DISTINCT ON guards against the same bar arriving in two overlapping pages of one run
+merge_queries = {
+    'nothing': '''
+        INSERT INTO asset_price (asset_id, open_time, open, high, low, close, volume, close_time)
+        SELECT DISTINCT ON (asset_id, open_time) asset_id, open_time, open, high, low, close, volume, close_time
+        FROM asset_price_staging
+        ORDER BY asset_id, open_time
+        ON CONFLICT (asset_id, open_time) DO NOTHING;
+    ''',
+    'update': '''
+        INSERT INTO asset_price (asset_id, open_time, open, high, low, close, volume, close_time)
+        SELECT DISTINCT ON (asset_id, open_time) asset_id, open_time, open, high, low, close, volume, close_time
+        FROM asset_price_staging
+        ORDER BY asset_id, open_time
+        ON CONFLICT (asset_id, open_time) DO UPDATE
+        SET open = EXCLUDED.open,
+            high = EXCLUDED.high,
+            low = EXCLUDED.low,
+            close = EXCLUDED.close,
+            volume = EXCLUDED.volume,
+            close_time = EXCLUDED.close_time
+        WHERE (asset_price.open, asset_price.high, asset_price.low, asset_price.close, asset_price.volume, asset_price.close_time)
+            IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume, EXCLUDED.close_time);
+    ''',
+}
+
+def klines_to_frame(asset_id: int, klines: list) -> pd.DataFrame:
+    # Column-wise conversion of the raw kline arrays. Prices stay as the exchange's decimal strings
+    # so NUMERIC columns receive exactly what Binance sent.
+    if not klines:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+
+    raw = pd.DataFrame(klines).iloc[:, :7]
+    raw.columns = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time']
+
+    frame = pd.DataFrame({
+        'asset_id': asset_id,
+        'open_time': pd.to_datetime(raw['open_time'].astype('int64'), unit='ms', utc=True),
+        'open': raw['open'],
+        'high': raw['high'],
+        'low': raw['low'],
+        'close': raw['close'],
+        'volume': raw['volume'],
+        'close_time': pd.to_datetime(raw['close_time'].astype('int64'), unit='ms', utc=True),
+    })
+    return frame[PRICE_COLUMNS]
+
+class PriceWriter:
+    # Buffers kline frames for a run and merges them into asset_price in one transaction:
+    # COPY into a temp staging table, then INSERT ... ON CONFLICT from staging and refresh asset_watermark.
+    def __init__(self, on_conflict: str = 'update'):
+        if on_conflict not in merge_queries:
+            raise ValueError(f'on_conflict must be one of {list(merge_queries)}')
+        self.on_conflict = on_conflict
+        self.frames = []
+        self.rows = 0
+
+    def add(self, asset_id: int, klines: list):
+        frame = klines_to_frame(asset_id, klines)
+        if not frame.empty:
+            self.frames.append(frame)
+            self.rows += len(frame)
+        return len(frame)
+
+    def to_csv(self) -> StringIO:
+        buffer = StringIO()
+        pd.concat(self.frames, ignore_index=True).to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S.%f%z')
+        buffer.seek(0)
+        return buffer
+
+    def flush(self, engine) -> int:
+        if not self.frames:
+            logging.info('No new candles to ingest.')
+            return 0
+
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(create_staging_query)
+            cursor.copy_expert(copy_staging_query, self.to_csv())
+            cursor.execute(merge_queries[self.on_conflict])
+            merged = cursor.rowcount
+            # Without the table (db/migrate.sql not run yet) the candles are still merged, readers scan asset_price
+            cursor.execute(watermark_table_sql)
+            if cursor.fetchone()[0]:
+                cursor.execute(refresh_watermarks_sql)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        logging.info(f'Staged {self.rows} candles | {merged} rows merged into asset_price')
+        self.frames = []
+        self.rows = 0
+        return merged
@@ -0,0 +1,50 @@
+'''Wide, date-indexed price matrix for the pair tests.
+
+Built once per window from the long asset_price frame. Values are stored symbols x days in one
+C-contiguous float64 block: the cointegration engine indexes its rows through self.row, pair()
+returns row views for legs without gaps, and frame() exposes the same memory as date x symbol columns.
+
+Missing data policies:
+    pairwise - keep gaps as NaN, each pair is inner-joined on the days both legs traded
+    complete - inner join across the whole universe, days where any symbol is missing are dropped
+    ffill    - forward fill gaps (up to ffill_limit days), anything left is handled pairwise
+'''
+import numpy as np
+import pandas as pd
+
+MISSING_POLICIES = ('pairwise', 'complete', 'ffill')
+
+class PriceMatrix:
+    def __init__(self, frame: pd.DataFrame, value: str = 'close', date_column: str = 'timestamp', policy: str = 'pairwise', ffill_limit: int = None, symbols: list = None):
+        if policy not in MISSING_POLICIES:
+            raise ValueError(f'policy must be one of {MISSING_POLICIES}')
+        self.policy = policy
+
+        wide = frame.pivot(index=date_column, columns='symbol', values=value).sort_index()
+        if symbols is not None:
+            wide = wide.reindex(columns=list(symbols))
+        if policy == 'ffill':
+            wide = wide.ffill(limit=ffill_limit)
+        elif policy == 'complete':
+            wide = wide.dropna(axis=0, how='any')
+
+        self.dates = wide.index
+        self.symbols = list(wide.columns)
+        self.values = np.ascontiguousarray(wide.to_numpy(dtype=np.float64).T)
+        self.row = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.complete = ~np.isnan(self.values).any(axis=1)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def frame(self) -> pd.DataFrame:
+        # date x symbol view of the same memory
+        return pd.DataFrame(self.values.T, index=self.dates, columns=self.symbols, copy=False)
+
+    def pair(self, symbol_1: str, symbol_2: str):
+        # (dates, closes_1, closes_2) on the days both legs traded. Views when neither leg has gaps.
+        i, j = self.row[symbol_1], self.row[symbol_2]
+        if self.complete[i] and self.complete[j]:
+            return self.dates, self.values[i], self.values[j]
+        valid = ~(np.isnan(self.values[i]) | np.isnan(self.values[j]))
+        return self.dates[valid], self.values[i][valid], self.values[j][valid]
@@ -0,0 +1,180 @@
+'''Local columnar mirror of asset_price for research runs.
+
+One uncompressed Arrow IPC file per calendar month, so a read memory-maps the file and the
+float64 price columns are used in place without decoding NUMERIC values again. The mirror is
+refreshed month by month: a month is re-exported when its row count in Postgres differs from
+the manifest, and the newest month is always refreshed because its last candle is updated in place.
+'''
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+from sqlalchemy import text
+
+MANIFEST_NAME = '_manifest.json'
+
+SCHEMA = pa.schema([
+    ('asset_id', pa.int32()),
+    ('symbol', pa.dictionary(pa.int32(), pa.string())),
+    ('open_time', pa.timestamp('us', tz='UTC')),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.float64()),
+])
+
+month_counts_query = text('''
+    SELECT to_char(open_time AT TIME ZONE 'UTC', 'YYYY-MM') AS month, COUNT(*) AS rows
+    FROM asset_price
+    GROUP BY 1
+    ORDER BY 1;
+''')
+
+month_export_query = text('''
+    SELECT ap.asset_id, a.symbol, ap.open_time,
+        CAST(ap.open AS DOUBLE PRECISION) AS open,
+        CAST(ap.high AS DOUBLE PRECISION) AS high,
+        CAST(ap.low AS DOUBLE PRECISION) AS low,
+        CAST(ap.close AS DOUBLE PRECISION) AS close,
+        CAST(ap.volume AS DOUBLE PRECISION) AS volume
+    FROM asset_price AS ap
+    INNER JOIN asset AS a ON ap.asset_id = a.id
+    WHERE ap.open_time >= :month_start AND ap.open_time < :month_end
+    ORDER BY ap.open_time, ap.asset_id;
+''')
+
+def month_path(root: str, month: str) -> str:
+    return os.path.join(root, f'month={month}.arrow')
+
+def read_manifest(root: str) -> dict:
+    path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(root: str, manifest: dict):
+    path = os.path.join(root, MANIFEST_NAME)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def month_bounds(month: str):
+    start = datetime.strptime(f'{month}-01', '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+def export_month(engine, root: str, month: str) -> int:
+    month_start, month_end = month_bounds(month)
+    frame = pd.read_sql(month_export_query, engine, params={'month_start': month_start, 'month_end': month_end})
+    frame['open_time'] = pd.to_datetime(frame['open_time'], utc=True)
+    table = pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False).combine_chunks()
+
+    # write then rename so a reader never maps a half written partition
+    path = month_path(root, month)
+    tmp_path = f'{path}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, SCHEMA) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+def sync_price_store(engine, root: str) -> list:
+    # Bring the mirror up to date with asset_price, returns the months that were rewritten
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+
+    with engine.connect() as connection:
+        db_counts = {month: rows for month, rows in connection.execute(month_counts_query)}
+
+    if not db_counts:
+        logging.info('asset_price is empty, nothing to mirror')
+        return []
+
+    newest_month = max(db_counts)
+    stale = [month for month, rows in sorted(db_counts.items()) if manifest.get(month) != rows or month == newest_month]
+
+    for month in stale:
+        manifest[month] = export_month(engine, root, month)
+        logging.info(f'Price store | wrote {month} | {manifest[month]} rows')
+
+    # months that disappeared from the database are dropped from the mirror too
+    for month in set(manifest) - set(db_counts):
+        os.remove(month_path(root, month))
+        del manifest[month]
+
+    write_manifest(root, manifest)
+    return stale
+
+def to_utc(timestamp) -> pd.Timestamp:
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+def read_table(root: str, start, end, columns: list = None) -> pa.Table:
+    # Memory-mapped read of every month overlapping [start, end] (inclusive). Partitions are sorted by
+    # open_time so the range is a slice, and the returned columns reference the mapped files directly.
+    start, end = to_utc(start), to_utc(end)
+    manifest = read_manifest(root)
+    months = [month for month in sorted(manifest) if month_bounds(month)[1] > start and month_bounds(month)[0] <= end]
+    start_us = np.datetime64(start.tz_localize(None), 'us')
+    end_us = np.datetime64(end.tz_localize(None), 'us')
+
+    tables = []
+    for month in months:
+        source = pa.memory_map(month_path(root, month), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        if table.num_rows == 0:
+            continue
+        times = table.column('open_time').chunk(0).to_numpy(zero_copy_only=True)
+        first = np.searchsorted(times, start_us, side='left')
+        last = np.searchsorted(times, end_us, side='right')
+        table = table.slice(first, last - first)
+        tables.append(table if columns is None else table.select(columns))
+
+    if not tables:
+        schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(name) for name in columns])
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+def read_columns(root: str, start, end, columns: list = ('close', 'volume')) -> dict:
+    # name -> one array per month chunk, read in place from the mapped files. Numeric and open_time columns
+    # are NumPy views (no copies as long as they have no nulls); the dictionary encoded symbol column is a
+    # Categorical over the chunk's dictionary codes, so no Python string is built per row.
+    table = read_table(root, start, end, list(columns))
+    arrays = {}
+    for name in columns:
+        chunks = [chunk for chunk in table.column(name).chunks if len(chunk)]
+        if pa.types.is_dictionary(SCHEMA.field(name).type):
+            arrays[name] = [pd.Categorical.from_codes(chunk.indices.to_numpy(zero_copy_only=True), categories=chunk.dictionary.to_pylist()) for chunk in chunks]
+        else:
+            arrays[name] = [chunk.to_numpy(zero_copy_only=True) for chunk in chunks]
+    return arrays
+
+# What prepare_window needs: the universe filters use close and volume, the close matrix asset_id, symbol and open_time
+WINDOW_COLUMNS = ('asset_id', 'symbol', 'open_time', 'close', 'volume')
+
+def load_window(root: str, start, end, asset_ids: list = None, columns: list = WINDOW_COLUMNS) -> pd.DataFrame:
+    # One frame of the window built from read_columns: the month chunks of each column are concatenated
+    # once, symbol stays categorical
+    arrays = read_columns(root, start, end, columns)
+    frame = pd.DataFrame({name: join_chunks(name, chunks) for name, chunks in arrays.items()})
+    if asset_ids is not None:
+        frame = frame[frame['asset_id'].isin(asset_ids)].reset_index(drop=True)
+    if 'symbol' in frame:
+        frame['symbol'] = frame['symbol'].cat.remove_unused_categories()
+    return frame
+
+def join_chunks(name: str, chunks: list):
+    field = SCHEMA.field(name)
+    if pa.types.is_dictionary(field.type):
+        return union_categoricals(chunks) if chunks else pd.Categorical([], categories=pd.Index([], dtype=str))
+    values = np.concatenate(chunks or [pa.array([], type=field.type).to_numpy(zero_copy_only=False)])
+    if pa.types.is_timestamp(field.type):
+        return pd.DatetimeIndex(values).tz_localize(field.type.tz)
+    return values
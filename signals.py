@@ -0,0 +1,53 @@
+'''Z-score signal state machine of the execution model.
+
+A pair is flat (0), long the spread (1: long symbol_1, short symbol_2) or short the spread
+(-1: short symbol_1, long symbol_2). Bar i acts on the z-score and thresholds of bar i - 1:
+
+    flat  -> long   when zscore <= -entry_threshold
+    long  -> flat   when zscore >=  exit_threshold
+    flat  -> short  when zscore >=  entry_threshold
+    short -> flat   when zscore <= -exit_threshold
+
+At most one transition per bar, checked in that order, and comparisons with NaN never fire.
+The state is the only thing carried from bar to bar, so one linear pass over plain floats gives
+every output column; the leg positions and position changes follow from the state array.
+'''
+import numpy as np
+
+def spread_states(zscore, entry_threshold, exit_threshold) -> np.ndarray:
+    # in_position for every bar, int64
+    zscore = np.asarray(zscore, dtype=np.float64).tolist()
+    entry = np.asarray(entry_threshold, dtype=np.float64).tolist()
+    exit = np.asarray(exit_threshold, dtype=np.float64).tolist()
+
+    states = [0] * len(zscore)
+    state = 0
+    for i in range(1, len(zscore)):
+        z, entry_i, exit_i = zscore[i - 1], entry[i - 1], exit[i - 1]
+        if state == 0 and z <= -entry_i:
+            state = 1
+        elif state == 1 and z >= exit_i:
+            state = 0
+        elif state == 0 and z >= entry_i:
+            state = -1
+        elif state == -1 and z <= -exit_i:
+            state = 0
+        states[i] = state
+    return np.asarray(states, dtype=np.int64)
+
+def spread_signals(zscore, entry_threshold, exit_threshold) -> dict:
+    '''in_position, the four leg position columns and position_change as NumPy arrays.
+    Leg keys are long_1, short_2 (long spread) and short_1, long_2 (short spread).'''
+    states = spread_states(zscore, entry_threshold, exit_threshold)
+    long_spread = (states == 1).astype(np.int64)
+    short_spread = (states == -1).astype(np.int64)
+    position_change = np.ones(len(states), dtype=bool)
+    position_change[1:] = states[1:] != states[:-1]
+    return {
+        'in_position': states,
+        'long_1': long_spread,
+        'short_2': -long_spread,
+        'short_1': -short_spread,
+        'long_2': short_spread,
+        'position_change': position_change,
+    }
@@ -0,0 +1,58 @@
+'''adf_batch and adf_many against statsmodels adfuller, series by series.'''
+import numpy as np
+import pytest
+from statsmodels.tsa.adfvalues import mackinnonp as statsmodels_mackinnonp
+from statsmodels.tsa.stattools import adfuller
+from batched_adf import adf_batch, adf_many, mackinnonp
+
+# adfuller results are read as tuples, like batched_adf does
+pytestmark = pytest.mark.filterwarnings('ignore:adfuller currently returns:FutureWarning')
+
+@pytest.fixture(scope='module')
+def series():
+    # Random walks, stationary AR(1) and AR(3) series, 366 days like a yearly window
+    rng = np.random.default_rng(11)
+    walks = np.cumsum(rng.normal(size=(20, 366)), axis=1)
+    ar = np.zeros((20, 366))
+    shocks = rng.normal(size=(20, 366))
+    for t in range(3, 366):
+        ar[:10, t] = 0.6 * ar[:10, t - 1] + shocks[:10, t]
+        ar[10:, t] = 0.5 * ar[10:, t - 1] + 0.2 * ar[10:, t - 2] - 0.3 * ar[10:, t - 3] + shocks[10:, t]
+    return np.concatenate([walks, ar])
+
+@pytest.mark.parametrize('regression', ['c', 'n'])
+def test_adf_batch_matches_adfuller(series, regression):
+    stats, pvalues, used_lags, nobs = adf_batch(series, regression=regression)
+    for row, stat, pvalue, used_lag, used_nobs in zip(series, stats, pvalues, used_lags, nobs):
+        expected = adfuller(row, regression=regression, autolag='AIC')
+        assert stat == pytest.approx(expected[0], abs=1e-9)
+        assert pvalue == pytest.approx(expected[1], abs=1e-9)
+        assert (used_lag, used_nobs) == (expected[2], expected[3])
+
+def test_adf_batch_fixed_lag(series):
+    stats, _, used_lags, _ = adf_batch(series[:5], regression='c', maxlag=4, autolag=None)
+    for row, stat, used_lag in zip(series[:5], stats, used_lags):
+        expected = adfuller(row, regression='c', maxlag=4, autolag=None)
+        assert stat == pytest.approx(expected[0], abs=1e-9)
+        assert used_lag == expected[2] == 4
+
+def test_adf_many_mixed_lengths_and_constant_spread(series):
+    spreads = [series[0], series[25][:200], np.full(100, 3.0), series[30], series[5][:200]]
+    results = adf_many(spreads, regression='c')
+    for spread, (stat, pvalue, error) in zip(spreads, results):
+        if spread.max() == spread.min():
+            # Constant input goes through adfuller alone and reports its error
+            with pytest.raises(ValueError):
+                adfuller(spread, regression='c')
+            assert (stat, pvalue) == (None, None) and error
+            continue
+        expected = adfuller(spread, regression='c')
+        assert error is None
+        assert stat == pytest.approx(expected[0], abs=1e-9)
+        assert pvalue == pytest.approx(expected[1], abs=1e-9)
+
+@pytest.mark.parametrize('regression, N', [('c', 1), ('n', 1), ('c', 2)])
+def test_mackinnonp_matches_statsmodels(regression, N):
+    stats = np.linspace(-25, 5, 301)
+    expected = [statsmodels_mackinnonp(stat, regression=regression, N=N) for stat in stats]
+    np.testing.assert_allclose(mackinnonp(stats, regression=regression, N=N), expected, rtol=1e-12, atol=1e-15)
@@ -0,0 +1,58 @@
+'''coint_batch and the coint engine against statsmodels coint, pair by pair.'''
+import warnings
+from itertools import combinations
+import numpy as np
+import pytest
+from statsmodels.tsa.stattools import coint
+import batched_coint
+from batched_coint import coint_batch
+from coint_engine import run_coint_tests
+from pair_tiles import tile_rows
+
+@pytest.fixture(scope='module')
+def matrix():
+    # 24 symbols x 385 days: random walks, a cointegrated family, a colinear pair and a leg listed mid-window
+    rng = np.random.default_rng(7)
+    matrix = np.cumsum(rng.normal(size=(24, 385)), axis=1) + 100
+    matrix[6:14] = matrix[0] * np.linspace(0.5, 2, 8)[:, None] + rng.normal(size=(8, 385))
+    matrix[15] = 2 * matrix[16]
+    matrix[20, :40] = np.nan
+    return matrix
+
+def statsmodels_coint(matrix, i, j):
+    valid = ~(np.isnan(matrix[i]) | np.isnan(matrix[j]))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        coint_t, pvalue, _ = coint(matrix[i][valid], matrix[j][valid])
+    return coint_t, pvalue
+
+def assert_matches_statsmodels(matrix, results):
+    for i, j, coint_t, pvalue, error in results:
+        assert error is None
+        expected_t, expected_p = statsmodels_coint(matrix, i, j)
+        if np.isinf(expected_t):
+            assert (coint_t, pvalue) == (expected_t, expected_p)
+        else:
+            assert coint_t == pytest.approx(expected_t, abs=1e-8)
+            assert pvalue == pytest.approx(expected_p, abs=1e-8)
+
+def test_coint_batch_matches_statsmodels(matrix):
+    pairs = list(combinations(range(len(matrix)), 2))
+    results = coint_batch(matrix, pairs)
+    assert sorted((i, j) for i, j, *_ in results) == pairs
+    assert_matches_statsmodels(matrix, results)
+
+def test_per_pair_products_match_statsmodels(matrix, monkeypatch):
+    # Batches spread over more symbols than GRAM_MAX_ROWS skip the Gram matrix
+    monkeypatch.setattr(batched_coint, 'GRAM_MAX_ROWS', 0)
+    pairs = list(combinations(range(0, len(matrix), 3), 2)) + [(15, 16), (20, 21)]
+    assert_matches_statsmodels(matrix, coint_batch(matrix, pairs))
+
+def test_engine_on_tile_ordered_pairs(matrix):
+    expected = {(i, j): (coint_t, pvalue) for i, j, coint_t, pvalue, _ in coint_batch(matrix, list(combinations(range(len(matrix)), 2)))}
+    pairs = ((int(i), int(j)) for rows_1, rows_2 in tile_rows(len(matrix), 8) for i, j in zip(rows_1, rows_2))
+    results = {(i, j): (coint_t, pvalue) for batch in run_coint_tests(matrix, pairs, max_workers=1, batch_size=50) for i, j, coint_t, pvalue, _ in batch}
+    assert results.keys() == expected.keys()
+    for key, (coint_t, pvalue) in results.items():
+        assert coint_t == pytest.approx(expected[key][0], abs=1e-10)
+        assert pvalue == pytest.approx(expected[key][1], abs=1e-10)
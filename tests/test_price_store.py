@@ -0,0 +1,51 @@
+'''The research read path of the local price store: load_window against a plain to_pandas read.'''
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from price_store import SCHEMA, month_path, write_manifest, read_table, read_columns, load_window
+
+@pytest.fixture
+def store(tmp_path):
+    # Two months of daily candles for three symbols, each month file with its own symbol dictionary
+    rng = np.random.default_rng(5)
+    manifest = {}
+    for month, symbols in [('2022-01', ['AUSDT', 'BUSDT', 'CUSDT']), ('2022-02', ['CUSDT', 'AUSDT', 'BUSDT'])]:
+        days = pd.date_range(f'{month}-01', periods=28, tz='UTC')
+        frame = pd.DataFrame({
+            'asset_id': np.tile([{'AUSDT': 1, 'BUSDT': 2, 'CUSDT': 3}[symbol] for symbol in symbols], len(days)).astype(np.int32),
+            'symbol': np.tile(symbols, len(days)),
+            'open_time': np.repeat(days, len(symbols)),
+        })
+        for column in ('open', 'high', 'low', 'close', 'volume'):
+            frame[column] = rng.uniform(1, 100, len(frame))
+        table = pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False)
+        with pa.OSFile(month_path(str(tmp_path), month), 'wb') as sink:
+            with pa.ipc.new_file(sink, SCHEMA) as writer:
+                writer.write_table(table)
+        manifest[month] = table.num_rows
+    write_manifest(str(tmp_path), manifest)
+    return str(tmp_path)
+
+def test_load_window_matches_to_pandas(store):
+    columns = ['asset_id', 'symbol', 'open_time', 'close', 'volume']
+    expected = read_table(store, '2022-01-10', '2022-02-05', columns).to_pandas()
+    frame = load_window(store, '2022-01-10', '2022-02-05')
+    assert isinstance(frame['symbol'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(frame.assign(symbol=frame['symbol'].astype(str)), expected.assign(symbol=expected['symbol'].astype(str)), check_dtype=False)
+    assert frame['open_time'].dt.tz is not None
+
+def test_load_window_asset_filter_drops_unused_symbols(store):
+    frame = load_window(store, '2022-01-01', '2022-02-28', asset_ids=[1, 3])
+    assert sorted(frame['symbol'].cat.categories) == ['AUSDT', 'CUSDT']
+    assert set(frame['asset_id']) == {1, 3}
+
+def test_read_columns_are_views_of_the_mapped_files(store):
+    arrays = read_columns(store, '2022-01-10', '2022-02-05', ('close', 'symbol'))
+    assert len(arrays['close']) == 2
+    assert all(not chunk.flags.owndata for chunk in arrays['close'])
+    assert all(isinstance(chunk, pd.Categorical) for chunk in arrays['symbol'])
+
+def test_empty_store(tmp_path):
+    frame = load_window(str(tmp_path), '2022-01-01', '2022-02-01')
+    assert len(frame) == 0 and list(frame.columns) == ['asset_id', 'symbol', 'open_time', 'close', 'volume']
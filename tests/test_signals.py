@@ -0,0 +1,98 @@
+'''spread_signals against a verbatim copy of the position loop execution_model ran before signals.py.'''
+import numpy as np
+import pandas as pd
+import pytest
+from signals import spread_signals, spread_states
+
+pair_1, pair_2 = 'AUSDT', 'BUSDT'
+
+def old_positions(df):
+    # Verbatim from execution_model before the linear signal pass
+    # Initialize columns for trading positions for both assets, including long and short positions
+    df[f'pos_{(pair_1).lower()}_long'] = 0
+    df[f'pos_{(pair_2).lower()}_long'] = 0
+    df[f'pos_{(pair_1).lower()}_short'] = 0
+    df[f'pos_{(pair_2).lower()}_short'] = 0
+
+    df['in_position'] = 0
+    # Set trading positions based on z-score conditions
+    for i in range(1, len(df)):
+        zscore = df.at[i-1,'zscore']
+        entry_threshold = df.at[i-1, 'entry_threshold']
+        exit_threshold = df.at[i-1, 'exit_threshold']
+
+        if df.at[i, 'in_position'] == 0 and zscore <= -entry_threshold:
+            df.loc[i:, (f'pos_{pair_1.lower()}_long', f'pos_{pair_2.lower()}_short')] = [1, -1]
+            df.loc[i:, 'in_position'] = 1
+            continue
+
+        if df.at[i, 'in_position'] == 1 and zscore >= exit_threshold:
+            df.loc[i:, (f'pos_{pair_1.lower()}_long', f'pos_{pair_2.lower()}_short')] = 0
+            df.loc[i:, 'in_position']  = 0 
+            continue
+
+        if df.at[i, 'in_position'] == 0 and zscore >= entry_threshold:
+            df.loc[i:, (f'pos_{(pair_1).lower()}_short', f'pos_{(pair_2).lower()}_long')] = [-1, 1]
+            df.loc[i:, 'in_position']  = -1
+            continue
+
+        if df.at[i, 'in_position'] == -1 and zscore <= -exit_threshold:
+            df.loc[i:, (f'pos_{(pair_1).lower()}_short', f'pos_{(pair_2).lower()}_long')] = 0 
+            df.loc[i:, 'in_position']  = 0 
+            continue
+        
+    # Spread position | Extract long and short trading positions for both assets
+    long_spread = df.loc[:, (f'pos_{(pair_1).lower()}_long', f'pos_{(pair_2).lower()}_short')]
+    short_spread = df.loc[:, (f'pos_{(pair_1).lower()}_short', f'pos_{(pair_2).lower()}_long')]
+    
+    # Calculate position change
+    spread_change = (long_spread != long_spread.shift(1)).any(axis=1) | (short_spread != short_spread.shift(1)).any(axis=1)
+    df['position_change'] = spread_change
+    return df
+
+def new_positions(df):
+    # The columns execution_model now takes from spread_signals
+    signals = spread_signals(df['zscore'].to_numpy(), df['entry_threshold'].to_numpy(), df['exit_threshold'].to_numpy())
+    df[f'pos_{(pair_1).lower()}_long'] = signals['long_1']
+    df[f'pos_{(pair_2).lower()}_long'] = signals['long_2']
+    df[f'pos_{(pair_1).lower()}_short'] = signals['short_1']
+    df[f'pos_{(pair_2).lower()}_short'] = signals['short_2']
+    df['in_position'] = signals['in_position']
+    df['position_change'] = signals['position_change']
+    return df
+
+def random_frame(seed: int) -> pd.DataFrame:
+    # zscore and rolling thresholds shaped like execution_model's, with NaN warm-up rows,
+    # zero entry thresholds and the odd NaN zscore
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(0, 120))
+    spread = pd.Series(np.cumsum(rng.normal(size=n)))
+    df = pd.DataFrame({'zscore': (spread - spread.mean()) / spread.std()})
+    df['entry_threshold'] = spread.shift().rolling(20).std() * rng.choice([0.5, 0, 1])
+    df['exit_threshold'] = spread.shift().rolling(20).mean() * 0.25
+    if seed % 5 == 0 and n:
+        df.loc[rng.integers(0, n), 'zscore'] = np.nan
+    return df
+
+@pytest.mark.parametrize('seed', range(200))
+def test_matches_old_loop(seed):
+    df = random_frame(seed)
+    pd.testing.assert_frame_equal(new_positions(df.copy()), old_positions(df.copy()), check_dtype=True)
+
+@pytest.mark.parametrize('n', [0, 1, 2])
+def test_short_frames_match_old_loop(n):
+    df = pd.DataFrame({'zscore': [-3.0, 3.0][:n], 'entry_threshold': [1.0, 1.0][:n], 'exit_threshold': [0.5, 0.5][:n]})
+    pd.testing.assert_frame_equal(new_positions(df.copy()), old_positions(df.copy()), check_dtype=True)
+
+def test_transitions_act_on_previous_bar():
+    zscore = [-1.5, 0.0, 0.6, 1.2, -0.6, 0.0]
+    signals = spread_signals(zscore, [1.0] * 6, [0.5] * 6)
+    assert signals['in_position'].tolist() == [0, 1, 1, 0, -1, 0]
+    assert signals['position_change'].tolist() == [True, True, False, True, True, True]
+    assert signals['long_1'].tolist() == [0, 1, 1, 0, 0, 0]
+    assert signals['short_2'].tolist() == [0, -1, -1, 0, 0, 0]
+    assert signals['short_1'].tolist() == [0, 0, 0, 0, -1, 0]
+    assert signals['long_2'].tolist() == [0, 0, 0, 0, 1, 0]
+
+def test_nan_never_changes_state():
+    assert spread_states([np.nan, np.nan, -5.0, np.nan], [1.0, np.nan, 1.0, 1.0], [0.5] * 4).tolist() == [0, 0, 0, 1]
@@ -0,0 +1,116 @@
+'''run_time_slice over several slices: waiting for data, planning, resuming and completing a window.
+
+The pair_test tables rely on Postgres (FOR UPDATE SKIP LOCKED, JSONB), so these tests run against
+the database in TEST_DATABASE_URL and are skipped without it. Everything is created in its own
+schema, which is dropped again afterwards.
+'''
+import os
+from datetime import date
+from itertools import count as ticks
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+import pair_test_chunks
+import pair_workers
+from pair_test_chunks import run_time_slice
+from pair_tiles import pair_count
+from watermarks import rebuild_watermarks
+
+database_url = os.getenv('TEST_DATABASE_URL')
+pytestmark = pytest.mark.skipif(not database_url, reason='TEST_DATABASE_URL not set')
+
+TEST_SCHEMA = 'pair_slice_test'
+DDL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db', 'create_production_tables.sql')
+
+# The 26th of the month after the window 2021-12-05 --> 2022-01-25
+TODAY = date(2022, 1, 26)
+ASSETS = 24
+
+@pytest.fixture
+def engine():
+    admin = create_engine(database_url)
+    with admin.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {TEST_SCHEMA}'))
+    engine = create_engine(database_url, connect_args={'options': f'-csearch_path={TEST_SCHEMA}'})
+    with engine.begin() as connection:
+        connection.exec_driver_sql(open(DDL_PATH).read())
+    pd.DataFrame({'symbol': [f'S{k:02d}USDT' for k in range(ASSETS)], 'min_lot_size': '0.001', 'trading': 1, 'min_notional': '5'}).to_sql('asset', engine, if_exists='append', index=False)
+    yield engine
+    engine.dispose()
+    with admin.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA {TEST_SCHEMA} CASCADE'))
+    admin.dispose()
+
+def store_prices(engine, first_day, last_day):
+    # Daily candles from a common random walk, every third asset with its own drift on top
+    dates = pd.date_range('2021-11-01', '2022-02-01', tz='UTC')
+    rng = np.random.default_rng(0)
+    base = np.cumsum(rng.normal(size=len(dates))) + 100
+    keep = (dates >= pd.Timestamp(first_day, tz='UTC')) & (dates <= pd.Timestamp(last_day, tz='UTC'))
+    frames = []
+    for k in range(ASSETS):
+        close = base * (1 + k / 10) + rng.normal(size=len(dates)) * (0.5 if k % 2 else 4) + (np.cumsum(rng.normal(size=len(dates))) * 2 if k % 3 == 0 else 0)
+        close = np.abs(close) + 1
+        frames.append(pd.DataFrame({'asset_id': k + 1, 'open_time': dates, 'open': close, 'high': close, 'low': close, 'close': close, 'volume': 1000.0 * (k + 1), 'close_time': dates + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)})[keep])
+    pd.concat(frames).to_sql('asset_price', engine, if_exists='append', index=False, method='multi', chunksize=5000)
+    with Session(engine) as session:
+        rebuild_watermarks(session)
+
+def count(engine, table: str) -> int:
+    with engine.connect() as connection:
+        return connection.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+
+def run_slices(engine, limit: int = 50, **kwargs) -> list:
+    summaries = [run_time_slice(engine, TODAY, **kwargs)]
+    while summaries[-1]['state'] not in ('complete', 'failed'):
+        assert len(summaries) < limit, summaries
+        summaries.append(run_time_slice(engine, TODAY, **kwargs))
+    return summaries
+
+def assert_window_tested(engine):
+    with engine.connect() as connection:
+        symbols = connection.execute(text('SELECT symbols FROM pair_test_windows')).scalar()
+        significant = connection.execute(text('SELECT COUNT(*) FROM coint_test_results WHERE p_value < 0.05')).scalar()
+        stationary = connection.execute(text('SELECT COUNT(*) FROM adf_test_results WHERE stationary')).scalar()
+    assert len(symbols) > 2
+    assert count(engine, 'coint_test_results') == pair_count(len(symbols))
+    assert count(engine, 'adf_test_results') == significant
+    assert count(engine, 'trading_pairs') == min(stationary, 25)
+
+def test_waits_for_data_then_completes_over_several_slices(engine, monkeypatch):
+    store_prices(engine, '2021-11-01', '2022-01-24')
+    assert run_time_slice(engine, TODAY)['state'] == 'waiting for data'
+    assert count(engine, 'pair_test_windows') == 0
+
+    # A clock that moves one second per reading: each slice starts one shard, then its budget is spent
+    clock = ticks()
+    monkeypatch.setattr(pair_test_chunks, 'time', SimpleNamespace(monotonic=lambda: next(clock)))
+    store_prices(engine, '2022-01-25', '2022-01-25')
+    summaries = run_slices(engine, slice_seconds=5, shard_size=2)
+    assert summaries[-1]['state'] == 'complete'
+    with engine.connect() as connection:
+        shards = connection.execute(text("SELECT COUNT(*) FROM pair_test_shards WHERE status = 'done'")).scalar()
+    # Every shard was done by a later slice resuming where the previous one stopped
+    assert [summary['units_done'] for summary in summaries] == [1] * shards + [0] * (len(summaries) - shards)
+    assert_window_tested(engine)
+
+    # Every later slice finds the window complete and does nothing
+    assert run_time_slice(engine, TODAY) == {'window': summaries[-1]['window'], 'state': 'complete', 'units_done': 0}
+
+def test_slice_killed_while_planning_leaves_nothing_behind(engine, monkeypatch):
+    store_prices(engine, '2021-11-01', '2022-01-25')
+
+    def killed(*args, **kwargs):
+        raise RuntimeError('slice killed')
+    monkeypatch.setattr(pair_workers, 'enqueue_shards', killed)
+    with pytest.raises(RuntimeError):
+        run_time_slice(engine, TODAY, shard_size=2)
+    assert count(engine, 'pair_test_windows') == 0
+
+    monkeypatch.undo()
+    assert run_slices(engine, shard_size=2)[-1]['state'] == 'complete'
+    assert_window_tested(engine)
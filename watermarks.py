@@ -0,0 +1,95 @@
+from collections import namedtuple
+from datetime import timedelta
+import logging
+from sqlalchemy import text
+
+# first_open / last_close bound the stored bars of an asset, bars is how many rows exist between them
+Watermark = namedtuple('Watermark', ['asset_id', 'first_open', 'last_close', 'bars'])
+
+# Whole universe in one round-trip, assets without prices come back with NULL bounds
+watermarks_query = text('''
+    SELECT a.symbol, a.id, w.first_open, w.last_close, w.bars
+    FROM asset AS a
+    LEFT JOIN asset_watermark AS w ON w.asset_id = a.id;
+''')
+
+# Same rows straight from asset_price, used until db/migrate.sql has created asset_watermark
+scan_watermarks_query = text('''
+    SELECT a.symbol, a.id, p.first_open, p.last_close, p.bars
+    FROM asset AS a
+    LEFT JOIN (
+        SELECT asset_id, MIN(open_time) AS first_open, MAX(close_time) AS last_close, COUNT(*) AS bars
+        FROM asset_price
+        GROUP BY asset_id
+    ) AS p ON p.asset_id = a.id;
+''')
+
+# Plain string as well, price_ingest checks it on its raw psycopg2 cursor inside the merge transaction
+watermark_table_sql = "SELECT to_regclass('asset_watermark') IS NOT NULL;"
+watermark_table_query = text(watermark_table_sql)
+
+# Seeds / repairs the maintained table from asset_price with a single GROUP BY asset_id
+rebuild_watermarks_query = text('''
+    INSERT INTO asset_watermark (asset_id, first_open, last_close, bars, updated_at)
+    SELECT asset_id, MIN(open_time), MAX(close_time), COUNT(*), NOW()
+    FROM asset_price
+    GROUP BY asset_id
+    ON CONFLICT (asset_id) DO UPDATE
+    SET first_open = EXCLUDED.first_open,
+        last_close = EXCLUDED.last_close,
+        bars = EXCLUDED.bars,
+        updated_at = EXCLUDED.updated_at;
+''')
+
+# Run inside the ingest transaction after the merge, only for the assets that were just staged
+refresh_watermarks_sql = '''
+    INSERT INTO asset_watermark (asset_id, first_open, last_close, bars, updated_at)
+    SELECT ap.asset_id, MIN(ap.open_time), MAX(ap.close_time), COUNT(*), NOW()
+    FROM asset_price AS ap
+    WHERE ap.asset_id IN (SELECT DISTINCT asset_id FROM asset_price_staging)
+    GROUP BY ap.asset_id
+    ON CONFLICT (asset_id) DO UPDATE
+    SET first_open = EXCLUDED.first_open,
+        last_close = EXCLUDED.last_close,
+        bars = EXCLUDED.bars,
+        updated_at = EXCLUDED.updated_at;
+'''
+
+db_range_query = text('''
+    SELECT MIN(first_open), MAX(last_close) FROM asset_watermark;
+''')
+
+scan_db_range_query = text('''
+    SELECT MIN(open_time), MAX(close_time) FROM asset_price;
+''')
+
+def has_watermark_table(session) -> bool:
+    return session.execute(watermark_table_query).scalar()
+
+def load_watermarks(session) -> dict:
+    # symbol -> Watermark for every asset
+    if has_watermark_table(session):
+        result = session.execute(watermarks_query)
+    else:
+        logging.warning('asset_watermark is missing, run db/migrate.sql | scanning asset_price instead')
+        result = session.execute(scan_watermarks_query)
+    return {symbol: Watermark(asset_id, first_open, last_close, bars) for symbol, asset_id, first_open, last_close, bars in result}
+
+def rebuild_watermarks(session):
+    if not has_watermark_table(session):
+        return
+    session.execute(rebuild_watermarks_query)
+    session.commit()
+
+def load_db_range(session):
+    query = db_range_query if has_watermark_table(session) else scan_db_range_query
+    return session.execute(query).one()
+
+def covers_window(watermark: Watermark, window_start, window_end, step: timedelta = timedelta(days=1)) -> bool:
+    # True when the stored bars span the window without holes, so the asset needs no gap scan
+    if watermark.first_open is None:
+        return False
+    if watermark.first_open > window_start or watermark.last_close < window_end:
+        return False
+    expected_bars = round((watermark.last_close - watermark.first_open) / step)
+    return watermark.bars >= expected_bars